@@ -1,42 +1,81 @@
 import sys
 import os
+import json
 import traceback
-from fastapi import FastAPI, Response
 
 # Add paths
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(os.path.join(os.path.dirname(__file__), '../backend'))
 
-# Create a safe app that definitely starts
-app = FastAPI()
-
-@app.get("/api")
-def root():
-    return {"status": "Vercel Python is Running", "next_step": "Go to /api/debug to load backend"}
-
-@app.get("/api/debug")
-def debug_backend():
-    try:
-        # Attempt to import the real backend here (lazy loading)
-        from backend.app.main import app as real_app
-        return {"status": "Backend Import Successful!", "routes": [r.path for r in real_app.routes]}
-    except Exception:
-        return Response(content=f"IMPORT ERROR:\n{traceback.format_exc()}", media_type="text/plain", status_code=500)
-
-# Try to mount the real app if possible, but don't crash if it fails
-try:
-    from backend.app.main import app as real_app
-    # If successful, we mount it? 
-    # Vercel ENTRYPOINT needs 'app' to be the one taking traffic.
-    # If we overwrite 'app' here, we risk crash on startup.
-    # STRATEGY: We keep 'app' as the safe one, but we mount the real one under /api if it works?
-    # No, Vercel standard requires `app` to be THE app.
-    
-    # New Strategy: If import works, we overwrite 'app'. If not, we keep 'app' as the error reporter.
-    app = real_app
-except Exception:
-    pass # We already defined 'app' as the safe error reporter above.
-    # We will just let the safe app run. The user will see 404s for normal routes but /api/debug will work.
+# Vercel entry point, kept as a bare ASGI callable so that importing it costs
+# nothing: the real backend (FastAPI, SQLAlchemy, the routers) is imported on the
+# first request that needs it, and /api health checks never load it at all. If
+# the backend fails to import, every request gets a 500 pointing at /api/debug,
+# which shows the traceback.
+
+HEALTH_PATHS = ("/api", "/api/", "/api/health")
+
+_real_app = None
+_import_error = None
+
+
+def _load_backend():
+    global _real_app, _import_error
+    if _real_app is None and _import_error is None:
+        try:
+            from backend.app.main import app as real_app
+            _real_app = real_app
+        except Exception:
+            _import_error = traceback.format_exc()
+    return _real_app
+
+
+async def _respond(send, status, body, media_type="application/json"):
+    if not isinstance(body, (bytes, str)):
+        body = json.dumps(body)
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", media_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan_without_backend(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        # Servers that run lifespan events get the backend's startup hooks too
+        real_app = _load_backend()
+        if real_app is not None:
+            return await real_app(scope, receive, send)
+        return await _lifespan_without_backend(receive, send)
+
+    path = scope.get("path", "")
+    if scope["type"] == "http" and path in HEALTH_PATHS:
+        return await _respond(send, 200, {"status": "Vercel Python is Running", "backend_loaded": _real_app is not None})
+
+    real_app = _load_backend()
+    if scope["type"] == "http" and path == "/api/debug":
+        if real_app is None:
+            return await _respond(send, 500, f"IMPORT ERROR:\n{_import_error}", "text/plain")
+        return await _respond(send, 200, {"status": "Backend Import Successful!", "routes": list(real_app.openapi()["paths"])})
+
+    if real_app is None:
+        if scope["type"] == "http":
+            return await _respond(send, 500, "Backend failed to import, see /api/debug", "text/plain")
+        return
+    await real_app(scope, receive, send)
 
 
 # Vercel needs "app" to be available at module level
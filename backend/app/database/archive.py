@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from typing import List, Optional
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from app import metrics
+from .database import SessionLocal
+from .models import ChatSession, Message, SessionArchive
+
+logger = logging.getLogger(__name__)
+
+# Cold-session archival. Sessions not updated for ARCHIVE_AFTER_DAYS days have
+# their messages packed into one compressed blob in session_archives and
+# deleted from messages, which keeps the hot table and its indexes (and the
+# search index) to conversations people still use. ChatSession.archived_at
+# marks them.
+#
+# Opening an archived session (listing its messages or sending to it) puts its
+# messages back, with their original ids, and clears the mark; the queries that
+# would notice anyway carry the flag, so a hot session pays nothing extra.
+# Until then an archived session's messages are in exports but not in search.
+#
+# The job runs every ARCHIVE_INTERVAL seconds in each worker, ARCHIVE_BATCH_SESSIONS
+# sessions per transaction; sessions are claimed with a conditional UPDATE, so
+# workers never archive the same one twice. ARCHIVE_AFTER_DAYS=0 turns it off.
+# ARCHIVE_CODEC is zlib, or zstd with the optional zstandard package installed;
+# each archive records its codec, so changing it only affects new archives.
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", 0))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 3600))
+ARCHIVE_BATCH_SESSIONS = int(os.getenv("ARCHIVE_BATCH_SESSIONS", 100))
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "zlib")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("ARCHIVE_CODEC=zstd needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=9).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 9)
+    raise ValueError(f"Unknown archive codec {codec!r}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown archive codec {codec!r}")
+
+
+def pack(messages) -> bytes:
+    """Messages (rows with id, role, content, created_at) as one JSON array."""
+    return json.dumps(
+        [[m.id, m.role, m.content, m.created_at.isoformat() if m.created_at else None] for m in messages],
+        separators=(",", ":"),
+    ).encode()
+
+
+def unpack(data: bytes, codec: str) -> List[dict]:
+    return [
+        {"id": id, "role": role, "content": content, "created_at": created_at}
+        for id, role, content, created_at in json.loads(decompress(data, codec))
+    ]
+
+
+class SessionArchiver:
+    def __init__(self, session_factory=SessionLocal, after_days: float = ARCHIVE_AFTER_DAYS,
+                 interval: float = ARCHIVE_INTERVAL, batch_sessions: int = ARCHIVE_BATCH_SESSIONS,
+                 codec: str = ARCHIVE_CODEC):
+        self.session_factory = session_factory
+        self.after_days = after_days
+        self.interval = interval
+        self.batch_sessions = batch_sessions
+        self.codec = codec
+        self._task: Optional[asyncio.Task] = None
+        self.sessions_archived = 0
+        self.messages_archived = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.sessions_rehydrated = 0
+
+    def start(self):
+        if self.after_days > 0 and self.interval > 0 and self._task is None:
+            compress(b"", self.codec)  # fail at startup on a bad ARCHIVE_CODEC
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.archive_idle()
+            except Exception:
+                logger.exception("Session archival failed; will retry")
+            await asyncio.sleep(self.interval)
+
+    async def archive_idle(self) -> int:
+        """Archive every session idle for longer than after_days; returns how many."""
+        total = 0
+        while True:
+            archived = await self.archive_batch()
+            total += archived
+            if archived < self.batch_sessions:
+                return total
+
+    async def archive_batch(self, cutoff: Optional[datetime] = None) -> int:
+        """Archive up to batch_sessions sessions last updated before ``cutoff``, in one transaction."""
+        now = datetime.now(timezone.utc)
+        if cutoff is None:
+            cutoff = now - timedelta(days=self.after_days)
+        idle = (ChatSession.archived_at.is_(None), ChatSession.updated_at < cutoff)
+        candidates = select(ChatSession.id).where(*idle).order_by(ChatSession.updated_at).limit(self.batch_sessions)
+        async with self.session_factory() as db:
+            # updated_at is set to itself so its onupdate does not make the session look active
+            claimed = (await db.execute(
+                update(ChatSession)
+                .where(ChatSession.id.in_(candidates.scalar_subquery()), *idle)
+                .values(archived_at=now, updated_at=ChatSession.updated_at)
+                .returning(ChatSession.id)
+                .execution_options(synchronize_session=False)
+            )).scalars().all()
+            if not claimed:
+                return 0
+
+            rows = (await db.execute(
+                select(Message.session_id, Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.session_id.in_(claimed))
+                .order_by(Message.session_id, Message.id)
+            )).all()
+            # Compression is CPU work; keep it off the event loop
+            archives = await asyncio.to_thread(self._pack_sessions, rows)
+            if archives:
+                # A message saved after the rows were read is newer than every
+                # archived one, and stays in place
+                archived = [{"archive_session_id": archive["session_id"], "archive_max_id": archive.pop("max_id")}
+                            for archive in archives]
+                await db.execute(insert(SessionArchive), archives)
+                await db.execute(
+                    delete(Message.__table__).where(Message.session_id == bindparam("archive_session_id"),
+                                                    Message.id <= bindparam("archive_max_id")),
+                    archived,
+                )
+            await db.commit()
+
+        self.sessions_archived += len(claimed)
+        self.messages_archived += len(rows)
+        self.raw_bytes += sum(archive["raw_bytes"] for archive in archives)
+        self.stored_bytes += sum(len(archive["data"]) for archive in archives)
+        return len(claimed)
+
+    def _pack_sessions(self, rows) -> List[dict]:
+        archives = []
+        for session_id, messages in groupby(rows, key=lambda row: row.session_id):
+            messages = list(messages)
+            raw = pack(messages)
+            archives.append({"session_id": session_id, "message_count": len(messages), "raw_bytes": len(raw),
+                             "codec": self.codec, "data": compress(raw, self.codec), "max_id": messages[-1].id})
+        return archives
+
+    async def rehydrate(self, db, session_id: int):
+        """Move an archived session's messages back into messages, and commit."""
+        started = time.perf_counter()
+        reopened = (await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == session_id, ChatSession.archived_at.is_not(None))
+            .values(archived_at=None, updated_at=ChatSession.updated_at)
+            .execution_options(synchronize_session=False)
+        )).rowcount
+        # Nothing to do if a concurrent request got here first; its messages are
+        # visible once this statement has waited for it to commit
+        if reopened:
+            archives = (await db.execute(
+                select(SessionArchive.codec, SessionArchive.data).where(SessionArchive.session_id == session_id)
+            )).all()
+            rows = []
+            for codec, data in archives:
+                for message in unpack(data, codec):
+                    created_at = message["created_at"]
+                    rows.append({**message, "session_id": session_id,
+                                 "created_at": datetime.fromisoformat(created_at) if created_at else None})
+            if rows:
+                await db.execute(insert(Message), rows)
+            await db.execute(delete(SessionArchive).where(SessionArchive.session_id == session_id))
+            self.sessions_rehydrated += 1
+        await db.commit()
+        metrics.chat_rehydrate_seconds.observe(metrics.elapsed(started))
+
+    def stats(self) -> dict:
+        return {
+            "sessions_archived": self.sessions_archived,
+            "messages_archived": self.messages_archived,
+            "raw_bytes": self.raw_bytes,
+            "stored_bytes": self.stored_bytes,
+            "sessions_rehydrated": self.sessions_rehydrated,
+        }
+
+
+session_archiver = SessionArchiver()
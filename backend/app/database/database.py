@@ -1,6 +1,6 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from databases import Database
 import os
 from dotenv import load_dotenv
 
@@ -12,17 +12,73 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./titanbot.db")
 if os.getenv("VERCEL") and "sqlite" in DATABASE_URL:
      DATABASE_URL = "sqlite:///T:/tmp/titanbot.db" if os.name == 'nt' else "sqlite:////tmp/titanbot.db"
 
-# For Databases (async)
-database = Database(DATABASE_URL)
+# Create tables on startup instead of via migrations. Off by default; on for
+# the Vercel /tmp SQLite fallback, which starts empty on every cold start.
+DB_AUTO_CREATE = os.getenv("DB_AUTO_CREATE", "1" if os.getenv("VERCEL") and "sqlite" in DATABASE_URL else "").lower() in ("1", "true", "yes")
 
-# For SQLAlchemy (async)
-# Note: SQLite requires acls for async usually, or use a specific driver.
-# But for simplicity in this artifact, we will use standard async setup.
-# If using SQLite with async, URL should be sqlite+aiosqlite:///...
-if "sqlite" in DATABASE_URL:
-    DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
+# Engine tuning, all overridable from the environment
+DB_ECHO = os.getenv("DB_ECHO", "").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Dev-friendly SQLite settings: WAL lets readers run alongside the write-behind
+# writer, NORMAL sync is safe under WAL, and busy_timeout waits out short locks
+# instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+    "cache_size": "-20000",
+    "temp_store": "MEMORY",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Point plain sqlite:// and postgres:// URLs at their async drivers."""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_engine(url: str = DATABASE_URL, **overrides):
+    """Build the app's async engine with pooling and driver settings for ``url``."""
+    url = async_database_url(url)
+    options = {"echo": DB_ECHO, "query_cache_size": DB_STATEMENT_CACHE_SIZE}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"timeout": 30}
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+        if "+asyncpg" in url:
+            options["connect_args"] = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    options.update(overrides)
+
+    engine = create_async_engine(url, **options)
+    if url.startswith("sqlite"):
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+engine = create_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
 Base = declarative_base()
@@ -0,0 +1,99 @@
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .archive import unpack
+from .models import ChatSession, Message, SessionArchive, User
+
+# NDJSON export of users, sessions and messages, one JSON object per line with
+# a "type" field. Rows come from server-side cursors (AsyncSession.stream, which
+# is a named cursor on asyncpg and chunked fetchmany on SQLite) as plain column
+# tuples, EXPORT_CHUNK_SIZE at a time, and are encoded and sent as they arrive.
+# Memory stays flat however large the export: at most one chunk of rows and
+# EXPORT_BUFFER_BYTES of output are held at once.
+#
+# Records are ordered by type (users, then sessions, then messages grouped by
+# session) and each one carries the ids needed to put them back together. The
+# messages of archived sessions (see archive.py) come last, unpacked from their
+# archive EXPORT_ARCHIVE_CHUNK_SIZE archives at a time.
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 1000))
+EXPORT_BUFFER_BYTES = int(os.getenv("EXPORT_BUFFER_BYTES", 64 * 1024))
+EXPORT_ARCHIVE_CHUNK_SIZE = int(os.getenv("EXPORT_ARCHIVE_CHUNK_SIZE", 10))
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def _rows(db, statement, chunk_size: int = EXPORT_CHUNK_SIZE) -> AsyncIterator:
+    result = await db.stream(statement.execution_options(yield_per=chunk_size))
+    async for partition in result.partitions():
+        for row in partition:
+            yield row
+
+
+async def export_records(user_id: Optional[int] = None) -> AsyncIterator[dict]:
+    """Every record for ``user_id``, or for all users when it is None."""
+    users = select(User.id, User.email, User.full_name, User.role, User.is_active, User.created_at)
+    sessions = select(ChatSession.id, ChatSession.user_id, ChatSession.title, ChatSession.summary,
+                      ChatSession.created_at, ChatSession.updated_at)
+    messages = select(Message.id, Message.session_id, Message.role, Message.content, Message.created_at)
+    archives = select(SessionArchive.session_id, SessionArchive.codec, SessionArchive.data)
+    if user_id is not None:
+        users = users.where(User.id == user_id)
+        # The order of ix_chat_sessions_user_id_updated_at then ix_messages_session_id_id,
+        # so the rows come straight off the indexes instead of through a sort of the
+        # whole history
+        session_order = (ChatSession.updated_at, ChatSession.id)
+        sessions = sessions.where(ChatSession.user_id == user_id).order_by(*session_order)
+        messages = (messages.join(ChatSession, ChatSession.id == Message.session_id)
+                    .where(ChatSession.user_id == user_id).order_by(*session_order, Message.id))
+        archives = (archives.join(ChatSession, ChatSession.id == SessionArchive.session_id)
+                    .where(ChatSession.user_id == user_id).order_by(*session_order, SessionArchive.id))
+    else:
+        # Primary key order, so a bulk export is an index walk with no sort
+        users = users.order_by(User.id)
+        sessions = sessions.order_by(ChatSession.id)
+        messages = messages.order_by(Message.id)
+        archives = archives.order_by(SessionArchive.id)
+
+    async with SessionLocal() as db:
+        for kind, statement in (("user", users), ("session", sessions), ("message", messages)):
+            async for row in _rows(db, statement):
+                yield {"type": kind, **row._asdict()}
+        async for session_id, codec, data in _rows(db, archives, EXPORT_ARCHIVE_CHUNK_SIZE):
+            for message in unpack(data, codec):
+                yield {"type": "message", "id": message["id"], "session_id": session_id, "role": message["role"],
+                       "content": message["content"], "created_at": message["created_at"]}
+
+
+async def export_ndjson(user_id: Optional[int] = None, compress: bool = False) -> AsyncIterator[bytes]:
+    """The export as NDJSON bytes, in chunks of about EXPORT_BUFFER_BYTES, optionally gzipped."""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    async for record in export_records(user_id):
+        line = json.dumps(record, default=_default, separators=(",", ":")).encode() + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            chunk = b"".join(buffer)
+            buffer, size = [], 0
+            if gzip is not None:
+                chunk = gzip.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+    chunk = b"".join(buffer)
+    if gzip is not None:
+        chunk = gzip.compress(chunk) + gzip.flush()
+    if chunk:
+        yield chunk
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import event, Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
+from .search import create_search_index, drop_search_index
 
 class User(Base):
     __tablename__ = "users"
@@ -24,11 +25,21 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     title = Column(String, default="New Chat")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+    summary = Column(Text, nullable=True) # rolling summary of turns that left the context window
+    summary_message_id = Column(Integer, nullable=True) # last message folded into summary
+    archived_at = Column(DateTime(timezone=True), nullable=True) # messages moved to session_archives (see archive.py)
 
     user = relationship("User", back_populates="chats")
     messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # get_sessions: a user's sessions, most recently updated first
+        Index("ix_chat_sessions_user_id_updated_at", "user_id", "updated_at", "id"),
+        # archival job: sessions not archived yet, least recently updated first
+        Index("ix_chat_sessions_archived_at_updated_at", "archived_at", "updated_at"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -39,3 +50,44 @@ class Message(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     session = relationship("ChatSession", back_populates="messages")
+
+    __table_args__ = (
+        # get_messages: a session's messages in chronological order
+        Index("ix_messages_session_id_created_at", "session_id", "created_at", "id"),
+        # context builder: walks a session's history newest-first by id
+        Index("ix_messages_session_id_id", "session_id", "id"),
+    )
+
+class SessionArchive(Base):
+    __tablename__ = "session_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False, index=True)
+    message_count = Column(Integer, nullable=False)
+    raw_bytes = Column(Integer, nullable=False) # size of the packed messages before compression
+    codec = Column(String, nullable=False) # 'zlib' or 'zstd'
+    data = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TokenUsage(Base):
+    __tablename__ = "token_usage"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False) # start of the USAGE_BUCKET_SECONDS window
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # one row per user, model and window; flushes add to it
+        UniqueConstraint("user_id", "provider", "model", "bucket_start", name="uq_token_usage_bucket"),
+        # admin reports over a time range
+        Index("ix_token_usage_bucket_start", "bucket_start"),
+    )
+
+# Full-text index over messages.content (see search.py), created with the table
+event.listen(Message.__table__, "after_create", create_search_index)
+event.listen(Message.__table__, "before_drop", drop_search_index)
@@ -0,0 +1,41 @@
+import contextlib
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+# Counts SQL statements per request. Only wired up in debug mode (DEBUG=1),
+# where main.py reports the count in an X-DB-Queries response header.
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+
+_current: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+def install(engine):
+    """Start counting statements run through ``engine`` (an AsyncEngine)."""
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextlib.contextmanager
+def track():
+    """Count statements run by this task and any task it spawns while inside the block."""
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
@@ -0,0 +1,200 @@
+import math
+import os
+import re
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Full-text search over message content, kept in the database itself so it is
+# updated in the same transaction as every INSERT/UPDATE/DELETE on messages,
+# whichever code path writes them (request handlers, the write-behind writer,
+# migrations):
+#   - SQLite: an FTS5 index, maintained by triggers. Its content lives in the
+#     messages table (read through a view), so text is not stored twice. Each row
+#     also indexes its owner as a "u<user id>" token, so a search is an
+#     intersection of two posting lists inside the index rather than a scan of
+#     every match followed by a per-user filter.
+#   - PostgreSQL: a generated tsvector column with a GIN index.
+# Both backends get the same query semantics: every word must match (stemmed, so
+# "network" finds "networks"), a word ending in * matches as a prefix, and results
+# are ranked by BM25 relevance. Other databases have no index and fall back to a
+# case-insensitive substring match (LIKE), ranked the same way.
+# Messages still in the write-behind queue become searchable once flushed, and
+# those of archived sessions (see archive.py) again once the session is reopened.
+
+SEARCH_LANGUAGE = "english"  # PostgreSQL text search configuration; baked into the generated column
+MAX_TERMS = 16
+# Relevance is ranked over this many of the user's newest matches; older ones are
+# not returned, and a search that had more is reported as truncated
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", 500))
+
+SQLITE_DDL = [
+    """CREATE VIEW IF NOT EXISTS messages_search_source AS
+       SELECT messages.id AS id, messages.content AS content, 'u' || chat_sessions.user_id AS owner
+       FROM messages JOIN chat_sessions ON chat_sessions.id = messages.session_id""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+       content, owner, content='messages_search_source', content_rowid='id', tokenize='porter unicode61', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+       INSERT INTO messages_fts(rowid, content, owner)
+       SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+       INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+       SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_sessions WHERE id = old.session_id;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, session_id ON messages BEGIN
+       INSERT INTO messages_fts(messages_fts, rowid, content, owner)
+       SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_sessions WHERE id = old.session_id;
+       INSERT INTO messages_fts(rowid, content, owner)
+       SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id;
+       END""",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS messages_fts_update",
+    "DROP TRIGGER IF EXISTS messages_fts_delete",
+    "DROP TRIGGER IF EXISTS messages_fts_insert",
+    "DROP TABLE IF EXISTS messages_fts",
+    "DROP VIEW IF EXISTS messages_search_source",
+]
+
+POSTGRES_DDL = [
+    f"""ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('{SEARCH_LANGUAGE}', coalesce(content, ''))) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING gin (search_vector)",
+]
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_messages_search_vector",
+    "ALTER TABLE messages DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _statements(dialect: str, create: bool) -> List[str]:
+    if dialect == "sqlite":
+        return SQLITE_DDL if create else SQLITE_DROP
+    if dialect == "postgresql":
+        return POSTGRES_DDL if create else POSTGRES_DROP
+    return []
+
+
+def create_search_index(target, connection, **kw):
+    """after_create hook on the messages table (Base.metadata.create_all)."""
+    for statement in _statements(connection.dialect.name, True):
+        connection.execute(text(statement))
+
+
+def drop_search_index(target, connection, **kw):
+    """before_drop hook on the messages table."""
+    for statement in _statements(connection.dialect.name, False):
+        connection.execute(text(statement))
+
+
+def search_terms(query: str) -> List[Tuple[str, bool]]:
+    """(word, is_prefix) for each word of a user's query; other punctuation is ignored."""
+    return [(word, star == "*") for word, star in re.findall(r"(\w+)(\*?)", query)[:MAX_TERMS]]
+
+
+# Candidates are the newest matches for the user, which both indexes return without
+# ranking (FTS5 walks its posting lists in rowid order; PostgreSQL intersects the GIN
+# bitmap with the user's rows). Relevance is then computed over those rows only:
+# bm25 inside SQLite would first count every match of each term across all users,
+# which for a common word costs tens of milliseconds per million messages.
+_SQLITE_CANDIDATES = text("""
+    SELECT m.id, m.session_id, s.title, m.role, m.created_at, m.content
+    FROM messages_fts
+    JOIN messages m ON m.id = messages_fts.rowid
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE messages_fts MATCH :match
+    ORDER BY messages_fts.rowid DESC
+    LIMIT :candidates
+""")
+
+_POSTGRES_CANDIDATES = text(f"""
+    SELECT m.id, m.session_id, s.title, m.role, m.created_at, m.content
+    FROM messages m
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE m.search_vector @@ to_tsquery('{SEARCH_LANGUAGE}', :match) AND s.user_id = :user_id
+    ORDER BY m.id DESC
+    LIMIT :candidates
+""")
+
+
+_LIKE_CANDIDATES = """
+    SELECT m.id, m.session_id, s.title, m.role, m.created_at, m.content
+    FROM messages m
+    JOIN chat_sessions s ON s.id = m.session_id
+    WHERE s.user_id = :user_id AND {conditions}
+    ORDER BY m.id DESC
+    LIMIT :candidates
+"""
+
+
+def _like_pattern(word: str) -> str:
+    # A search word is \w+, so _ is the only LIKE wildcard it can contain
+    return "%" + word.lower().replace("_", "\\_") + "%"
+
+
+def _stems(terms: List[Tuple[str, bool]]) -> List[str]:
+    # Close enough to the indexes' stemming to count term hits when ranking
+    return [word.lower() if prefix or len(word) <= 4 else word.lower()[:max(4, len(word) - 3)] for word, prefix in terms]
+
+
+def rank(rows: list, terms: List[Tuple[str, bool]], k1: float = 1.2, b: float = 0.75) -> list:
+    """Order candidate rows by BM25, with document frequencies taken from the candidates."""
+    stems = _stems(terms)
+    docs = [re.findall(r"\w+", (row.content or "").lower()) for row in rows]
+    hits = [[sum(1 for word in words if word.startswith(stem)) for stem in stems] for words in docs]
+    n = len(rows)
+    avg_length = sum(len(words) for words in docs) / n if n else 0
+    idf = []
+    for j in range(len(stems)):
+        df = sum(1 for counts in hits if counts[j])
+        idf.append(math.log((n - df + 0.5) / (df + 0.5) + 1))
+    scores = []
+    for words, counts in zip(docs, hits):
+        norm = k1 * (1 - b + b * len(words) / avg_length) if avg_length else k1
+        scores.append(sum(weight * tf * (k1 + 1) / (tf + norm) for weight, tf in zip(idf, counts)))
+    order = sorted(range(n), key=lambda i: (-scores[i], -rows[i].id))
+    return [rows[i] for i in order]
+
+
+def snippet(content: str, terms: List[Tuple[str, bool]], words: int = 24) -> str:
+    """About ``words`` words of ``content`` around the first hit."""
+    tokens = (content or "").split()
+    stems = _stems(terms)
+    first = next((i for i, token in enumerate(tokens)
+                  if any(word.startswith(stem) for word in re.findall(r"\w+", token.lower()) for stem in stems)), 0)
+    start = max(0, min(first - words // 3, len(tokens) - words))
+    excerpt = " ".join(tokens[start:start + words])
+    return ("..." if start else "") + excerpt + ("..." if start + words < len(tokens) else "")
+
+
+async def search_messages(db: AsyncSession, user_id: int, query: str, offset: int = 0,
+                          limit: int = 20) -> Tuple[list, bool]:
+    """Dicts of message_id, session_id, session_title, role, snippet and created_at, best match first,
+    and whether older matches were left out because there were more than SEARCH_CANDIDATES."""
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    dialect = db.get_bind().dialect.name
+    params = {"user_id": user_id, "candidates": SEARCH_CANDIDATES}
+    if dialect == "sqlite":
+        words = " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in terms)
+        params["match"] = f"owner:u{user_id} AND content:({words})"
+        statement = _SQLITE_CANDIDATES
+    elif dialect == "postgresql":
+        params["match"] = " & ".join(f"{word}:*" if prefix else word for word, prefix in terms)
+        statement = _POSTGRES_CANDIDATES
+    else:
+        conditions = []
+        for i, (word, _) in enumerate(terms):
+            conditions.append(f"lower(m.content) LIKE :term{i} ESCAPE '\\'")
+            params[f"term{i}"] = _like_pattern(word)
+        statement = text(_LIKE_CANDIDATES.format(conditions=" AND ".join(conditions)))
+    rows = (await db.execute(statement, params)).all()
+    hits = [
+        {"message_id": row.id, "session_id": row.session_id, "session_title": row.title, "role": row.role,
+         "snippet": snippet(row.content, terms), "created_at": row.created_at}
+        for row in rank(rows, terms)[offset:offset + limit]
+    ]
+    return hits, len(rows) >= SEARCH_CANDIDATES
@@ -0,0 +1,183 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .database import SessionLocal
+from .models import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+# Token usage per (user, provider, model, time bucket), added up in memory as
+# generations finish and written every USAGE_FLUSH_INTERVAL seconds (and at
+# shutdown) as one upsert per flush, so the chat path never writes a usage row
+# itself.
+#
+# The daily quota (USAGE_DAILY_TOKEN_QUOTA tokens per user per UTC day, 0 for
+# none; admins are exempt) is checked against running totals kept in memory as
+# well. They are read from the table on first use (one query, not at startup)
+# and are per process, so with several workers each one enforces the quota on
+# what it has seen plus what had been flushed when it loaded.
+
+USAGE_BUCKET_SECONDS = int(os.getenv("USAGE_BUCKET_SECONDS", 3600))
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", 10))
+USAGE_DAILY_TOKEN_QUOTA = int(os.getenv("USAGE_DAILY_TOKEN_QUOTA", 0))
+
+DAY = 86400
+LOAD_RETRY_SECONDS = 30
+
+Key = Tuple[int, str, str, int]  # user_id, provider, model, bucket start (unix seconds)
+
+
+class UsageRecorder:
+    def __init__(self, session_factory=SessionLocal, bucket_seconds: int = USAGE_BUCKET_SECONDS,
+                 flush_interval: float = USAGE_FLUSH_INTERVAL, daily_quota: int = USAGE_DAILY_TOKEN_QUOTA):
+        self.session_factory = session_factory
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self.daily_quota = daily_quota
+        self._pending: Dict[Key, list] = {}  # -> [requests, prompt_tokens, completion_tokens]
+        self._today: Dict[int, int] = {}  # user_id -> tokens used on self._day
+        self._day = self._day_start(time.time())
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        self._load_retry_at = 0.0
+        self.flushed_rows = 0
+
+    @staticmethod
+    def _day_start(now: float) -> int:
+        return int(now // DAY * DAY)
+
+    def _roll_day(self, now: float):
+        day = self._day_start(now)
+        if day != self._day:
+            self._day = day
+            self._today.clear()
+
+    def record(self, user_id: int, provider: str, model: str, prompt_tokens: int, completion_tokens: int):
+        """Add one generation's usage. Never touches the database."""
+        now = time.time()
+        self._roll_day(now)
+        key = (user_id, provider, model, int(now // self.bucket_seconds * self.bucket_seconds))
+        totals = self._pending.get(key)
+        if totals is None:
+            totals = self._pending[key] = [0, 0, 0]
+        totals[0] += 1
+        totals[1] += prompt_tokens
+        totals[2] += completion_tokens
+        self._today[user_id] = self._today.get(user_id, 0) + prompt_tokens + completion_tokens
+
+    async def used_today(self, user_id: int) -> int:
+        await self._load()
+        self._roll_day(time.time())
+        return self._today.get(user_id, 0)
+
+    async def quota_wait(self, user_id: int) -> float:
+        """Seconds until the user's quota resets if it is used up, otherwise 0."""
+        if not self.daily_quota or await self.used_today(user_id) < self.daily_quota:
+            return 0.0
+        return self._day + DAY - time.time()
+
+    async def _load(self):
+        """Seed today's per-user totals from the table, once. A failure is logged and
+        retried after LOAD_RETRY_SECONDS; until then the in-memory totals are used."""
+        if self._loaded or time.monotonic() < self._load_retry_at:
+            return
+        # Under the flush lock, so every recorded count is either in the table or
+        # still pending, never both or neither
+        async with self._lock:
+            if self._loaded:
+                return
+            self._roll_day(time.time())
+            day = datetime.fromtimestamp(self._day, timezone.utc)
+            try:
+                async with self.session_factory() as db:
+                    result = await db.execute(
+                        select(TokenUsage.user_id, func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens))
+                        .where(TokenUsage.bucket_start >= day)
+                        .group_by(TokenUsage.user_id)
+                    )
+                    totals = {user_id: int(tokens or 0) for user_id, tokens in result.all()}
+            except Exception:
+                logger.exception("Could not load today's token usage; retrying in %ds", LOAD_RETRY_SECONDS)
+                self._load_retry_at = time.monotonic() + LOAD_RETRY_SECONDS
+                return
+            for (user_id, _, _, bucket), (_, prompt, completion) in self._pending.items():
+                if bucket >= self._day:
+                    totals[user_id] = totals.get(user_id, 0) + prompt + completion
+            self._today = totals
+            self._loaded = True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Usage flush failed; will retry")
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            rows = [
+                {"user_id": user_id, "provider": provider, "model": model,
+                 "bucket_start": datetime.fromtimestamp(bucket, timezone.utc),
+                 "requests": requests, "prompt_tokens": prompt, "completion_tokens": completion}
+                for (user_id, provider, model, bucket), (requests, prompt, completion) in pending.items()
+            ]
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(_upsert(db.get_bind().dialect.name), rows)
+                    await db.commit()
+            except BaseException:
+                # Put the counts back so the next flush retries them
+                for key, (requests, prompt, completion) in pending.items():
+                    totals = self._pending.setdefault(key, [0, 0, 0])
+                    totals[0] += requests
+                    totals[1] += prompt
+                    totals[2] += completion
+                raise
+            self.flushed_rows += len(rows)
+
+    def stats(self) -> dict:
+        return {"pending_buckets": len(self._pending), "flushed_rows": self.flushed_rows}
+
+
+def _upsert(dialect: str):
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statement = insert(TokenUsage)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "provider", "model", "bucket_start"],
+        set_={
+            "requests": TokenUsage.requests + excluded.requests,
+            "prompt_tokens": TokenUsage.prompt_tokens + excluded.prompt_tokens,
+            "completion_tokens": TokenUsage.completion_tokens + excluded.completion_tokens,
+        },
+    )
+
+
+usage_recorder = UsageRecorder()
@@ -0,0 +1,152 @@
+import asyncio
+import contextvars
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert, update
+
+from .database import SessionLocal
+from .models import ChatSession, Message
+
+logger = logging.getLogger(__name__)
+
+# Chat turns are written after the stream has finished, by a background task
+# that batches them across requests: one INSERT for every queued message and
+# one UPDATE for every touched session, in a single transaction. A flush runs
+# once MESSAGE_BATCH_SIZE turns are waiting or MESSAGE_FLUSH_INTERVAL seconds
+# after the first one arrived, whichever comes first.
+#
+# A failed flush (a locked database, a dropped connection) is retried up to
+# MESSAGE_WRITE_ATTEMPTS times with exponential backoff from
+# MESSAGE_WRITE_BACKOFF seconds; turns keep queueing behind it in order. If the
+# batch still fails, its turns are written one by one so a single bad turn
+# cannot take the rest of the batch with it, and only those that fail alone
+# are dropped.
+
+MESSAGE_WRITE_ATTEMPTS = int(os.getenv("MESSAGE_WRITE_ATTEMPTS") or 5)
+MESSAGE_WRITE_BACKOFF = float(os.getenv("MESSAGE_WRITE_BACKOFF") or 0.1)
+MESSAGE_WRITE_MAX_BACKOFF = 5.0
+
+
+class MessageWriter:
+    def __init__(self, session_factory=SessionLocal, batch_size: int = 200, flush_interval: float = 0.05,
+                 attempts: int = MESSAGE_WRITE_ATTEMPTS, backoff: float = MESSAGE_WRITE_BACKOFF):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.retried = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, List[dict]] = {}
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            # Fresh context: when started lazily from a request, the flush task must
+            # not inherit that request's context variables (e.g. its query counter).
+            loop = asyncio.get_running_loop()
+            self._task = contextvars.Context().run(loop.create_task, self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def save_turn(self, session_id: int, messages: List[dict], summary: Optional[dict] = None):
+        """Queue a turn's messages (and an optional summary update) for the next flush.
+
+        Never blocks and never touches the database on the caller's path.
+        """
+        self.start()
+        self._pending.setdefault(session_id, []).extend(messages)
+        self._queue.put_nowait((session_id, messages, summary))
+
+    def pending(self, session_id: int) -> List[dict]:
+        """Messages queued for a session but not yet written, oldest first.
+
+        Readers merge these in so a quick follow-up message still sees the
+        previous turn.
+        """
+        return list(self._pending.get(session_id, ()))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                for session_id, messages, _ in batch:
+                    pending = self._pending[session_id]
+                    del pending[:len(messages)]
+                    if not pending:
+                        del self._pending[session_id]
+                    self._queue.task_done()
+
+    async def _write(self, batch):
+        delay = self.backoff
+        for attempt in range(1, self.attempts + 1):
+            try:
+                await self.flush(batch)
+                return
+            except Exception:
+                if attempt == self.attempts:
+                    logger.exception("Writing %d chat turns failed %d times", len(batch), attempt)
+                    break
+                logger.warning("Writing %d chat turns failed (attempt %d of %d); retrying in %.1fs",
+                               len(batch), attempt, self.attempts, delay, exc_info=True)
+                self.retried += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MESSAGE_WRITE_MAX_BACKOFF)
+
+        if len(batch) == 1:
+            logger.error("Dropping a chat turn for session %d after a failed write", batch[0][0])
+            self.dropped += 1
+            return
+        # Keep whatever the batch can still save: write its turns one at a time
+        for turn in batch:
+            try:
+                await self.flush([turn])
+            except Exception:
+                logger.exception("Dropping a chat turn for session %d after a failed write", turn[0])
+                self.dropped += 1
+
+    async def flush(self, batch):
+        now = datetime.now(timezone.utc)
+        rows = []
+        sessions = {}
+        for session_id, messages, summary in batch:
+            rows.extend({"session_id": session_id, "role": m["role"], "content": m["content"]} for m in messages)
+            values = sessions.setdefault(session_id, {"id": session_id, "updated_at": now})
+            if summary:
+                values.update(summary)
+
+        async with self.session_factory() as db:
+            if rows:
+                await db.execute(insert(Message), rows)
+            await db.execute(update(ChatSession), list(sessions.values()))
+            await db.commit()
+
+
+message_writer = MessageWriter()
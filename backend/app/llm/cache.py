@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import AsyncIterator, List, Optional
+
+from app.llm import usage
+
+# Opt-in cache of finished completions, in front of the provider layer. The key
+# is (provider:model, hash of the system messages, normalised conversation), so
+# "Help!" and "  help " hit the same entry while anything that changes the
+# context - an earlier turn, the summary, the model - misses. A hit is replayed
+# chunk by chunk, exactly as the provider streamed it. Only replies that
+# finished without an error are stored.
+#
+# COMPLETION_CACHE selects the backend: empty (off), "memory" (per-process LRU
+# bounded by COMPLETION_CACHE_MAX_BYTES) or a redis:// URL for a cache shared by
+# all workers (needs the optional redis package; any Redis-compatible server works).
+
+COMPLETION_CACHE = os.getenv("COMPLETION_CACHE", "")
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", 3600))
+COMPLETION_CACHE_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+COMPLETION_CACHE_MAX_ENTRY_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRY_BYTES", 256 * 1024))
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?…]+$")
+
+
+def normalize(text: str) -> str:
+    """Fold case, Unicode forms, whitespace runs and trailing punctuation."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _WHITESPACE.sub(" ", text).strip()
+    return _TRAILING_PUNCTUATION.sub("", text)
+
+
+def cache_key(model: str, messages: List[dict]) -> str:
+    system = hashlib.sha256("\n".join(m["content"] for m in messages if m["role"] == "system").encode()).hexdigest()
+    turns = [[m["role"], normalize(m["content"])] for m in messages if m["role"] != "system"]
+    payload = json.dumps([model, system, turns], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Per-process LRU with a TTL, bounded by the total size of stored values."""
+
+    def __init__(self, max_bytes: int = COMPLETION_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self.bytes += len(value)
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        value, _ = self._entries.pop(key)
+        self.bytes -= len(value)
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.bytes, "evictions": self.evictions}
+
+
+class RedisCacheBackend:
+    """Shared cache on a Redis-compatible server; the server handles eviction."""
+
+    prefix = "titanbot:completion:"
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis().get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._redis().set(self.prefix + key, value, px=int(ttl * 1000))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {}
+
+
+class CompletionCache:
+    def __init__(self, backend=None, ttl: float = COMPLETION_CACHE_TTL,
+                 max_entry_bytes: int = COMPLETION_CACHE_MAX_ENTRY_BYTES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            # A cache outage must never fail the chat; fall through to the provider
+            self.errors += 1
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def put(self, key: str, chunks: List[str]):
+        value = json.dumps(chunks, ensure_ascii=False).encode()
+        if len(value) > self.max_entry_bytes:
+            return
+        try:
+            await self.backend.set(key, value, self.ttl)
+            self.stores += 1
+        except Exception:
+            self.errors += 1
+
+    async def stream(self, provider, model: Optional[str], messages: List[dict]) -> AsyncIterator[str]:
+        """provider.stream(), answered from the cache when the same context was seen before."""
+        if not self.enabled:
+            async for chunk in provider.stream(model, messages):
+                yield chunk
+            return
+
+        key = cache_key(f"{provider.name}:{model or ''}", messages)
+        cached = await self.get(key)
+        if cached is not None:
+            usage.mark_cached()
+            for chunk in cached:
+                yield chunk
+            return
+
+        chunks = []
+        async for chunk in provider.stream(model, messages):
+            chunks.append(chunk)
+            yield chunk
+        # Only reached when the provider finished without raising
+        if chunks:
+            await self.put(key, chunks)
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "errors": self.errors,
+        }
+        if self.backend is not None:
+            stats.update(self.backend.stats())
+        return stats
+
+
+def create_cache(setting: str = COMPLETION_CACHE) -> CompletionCache:
+    if not setting:
+        return CompletionCache()
+    if setting == "memory":
+        return CompletionCache(MemoryCacheBackend())
+    if setting.startswith(("redis://", "rediss://", "unix://")):
+        return CompletionCache(RedisCacheBackend(setting))
+    raise ValueError(f"Unknown COMPLETION_CACHE backend: {setting}")
+
+
+completion_cache = create_cache()
@@ -0,0 +1,140 @@
+import os
+from typing import List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.database.models import ChatSession, Message
+from app.database.archive import session_archiver
+
+# Builds the prompt for a chat turn from the newest messages that fit a token
+# budget, walking the history backwards a page at a time. Turns that fall out
+# of the window are folded into ChatSession.summary once, so the cost of a
+# turn stays flat however long the conversation gets. In the common case the
+# whole thing, ownership check included, is one SELECT.
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CONTEXT_SUMMARY_TOKENS", 500))
+HISTORY_PAGE_SIZE = 50
+SUMMARY_LINE_CHARS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for budgeting
+    # without pulling a tokenizer into the request path.
+    return len(text) // 4 + 1
+
+
+def _summary_line(role: str, content: str) -> str:
+    text = " ".join(content.split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS - 3] + "..."
+    return f"{role.upper()}: {text}"
+
+
+def _trim_summary(lines: List[str], budget: int) -> str:
+    # Keep the most recent lines that fit; older ones age out of the summary.
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > budget:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+def _history_query(session_id: int, before_id: int):
+    return (
+        select(Message.id, Message.role, Message.content)
+        .where(Message.session_id == session_id, Message.id < before_id)
+        .order_by(Message.id.desc())
+        .limit(HISTORY_PAGE_SIZE)
+    )
+
+
+async def _history(db: AsyncSession, session_id: int, page):
+    """Yield stored messages newest-first, fetching further pages only when asked."""
+    while page:
+        for row in page:
+            yield row
+        if len(page) < HISTORY_PAGE_SIZE:
+            return
+        page = (await db.execute(_history_query(session_id, page[-1].id))).all()
+
+
+async def build_context(db: AsyncSession, session_id: int, user_id: int, system_prompt: str, new_message: str,
+                        pending: List[dict] = (), token_budget: int = CONTEXT_TOKEN_BUDGET
+                        ) -> Optional[Tuple[List[dict], Optional[dict]]]:
+    """Return chat messages for the next completion: system prompt, summary, stored
+    turns that fit the budget, and ``new_message`` (not yet saved) as the user turn.
+
+    ``pending`` are turns accepted but not yet written to the database; they are
+    newer than anything stored and take their share of the budget first.
+
+    The ownership check and the first page of history are a single statement.
+    Returns ``(messages, summary_update)``, where ``summary_update`` holds the
+    ChatSession columns to persist (or None), or ``None`` if the session does
+    not exist or belongs to another user.
+    """
+    budget = token_budget - estimate_tokens(system_prompt) - estimate_tokens(new_message) - SUMMARY_TOKEN_BUDGET
+    unsaved = []
+    for msg in reversed(pending):
+        cost = estimate_tokens(msg["content"])
+        if cost > budget:
+            break
+        budget -= cost
+        unsaved.append(msg)
+
+    first_page_query = (
+        select(ChatSession.summary, ChatSession.summary_message_id, ChatSession.archived_at,
+               Message.id, Message.role, Message.content)
+        .outerjoin(Message, Message.session_id == ChatSession.id)
+        .where(ChatSession.id == session_id, ChatSession.user_id == user_id)
+        .order_by(Message.id.desc())
+        .limit(HISTORY_PAGE_SIZE)
+    )
+    first_page = (await db.execute(first_page_query)).all()
+    if not first_page:
+        return None
+    if first_page[0].archived_at is not None:
+        # An archived session being picked up again: restore its history first
+        await session_archiver.rehydrate(db, session_id)
+        first_page = (await db.execute(first_page_query)).all()
+    summary = first_page[0].summary
+    summary_message_id = first_page[0].summary_message_id
+    first_page = [row for row in first_page if row.id is not None]
+
+    # Walk back through history: rows that fit go in the window, the rest (down to
+    # what is already summarised) are folded into the summary. Only the newest
+    # dropped turns can survive trimming, so never read more than that.
+    recent = []
+    dropped = []
+    window_full = len(unsaved) < len(pending)
+    max_dropped = max(1, SUMMARY_TOKEN_BUDGET // 8)
+    async for row in _history(db, session_id, first_page):
+        if not window_full:
+            cost = estimate_tokens(row.content)
+            if cost <= budget:
+                budget -= cost
+                recent.append(row)
+                continue
+            window_full = True
+        if (summary_message_id is not None and row.id <= summary_message_id) or len(dropped) >= max_dropped:
+            break
+        dropped.append(row)
+
+    summary_update = None
+    if dropped:
+        lines = summary.split("\n") if summary else []
+        lines.extend(_summary_line(row.role, row.content) for row in reversed(dropped))
+        summary = _trim_summary(lines, SUMMARY_TOKEN_BUDGET)
+        summary_update = {"summary": summary, "summary_message_id": dropped[0].id}
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    messages.extend({"role": row.role, "content": row.content} for row in reversed(recent))
+    messages.extend(reversed(unsaved))
+    messages.append({"role": "user", "content": new_message})
+    return messages, summary_update
@@ -0,0 +1,345 @@
+import os
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from app.llm.resolver import ModelResolver
+from app.llm.scheduler import InferenceScheduler, SchedulerBusy
+from app.llm import usage
+
+# Each provider owns one long-lived client (and its HTTP connection pool).
+# Clients are created once by ProviderRegistry.startup() - or lazily on first
+# use if the lifespan hooks never ran - and closed at shutdown, so a chat
+# request only pays for the generation itself.
+
+GEMINI_CANDIDATE_MODELS = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
+OLLAMA_MODEL_PREFIXES = ("llama", "mistral", "qwen", "phi", "deepseek", "codellama")
+OPENAI_MODEL_PREFIXES = ("gpt-", "o1", "o3", "o4")
+
+
+class ProviderError(Exception):
+    """Raised by a provider with a message that is safe to show to the user."""
+
+
+def flatten_messages(messages: List[dict]) -> str:
+    """Render chat messages as a single plain-text prompt."""
+    lines = []
+    for msg in messages:
+        if msg["role"] == "system":
+            lines.append(f"{msg['content']}\n")
+        else:
+            lines.append(f"{msg['role'].upper()}: {msg['content']}")
+    lines.append("ASSISTANT:")
+    return "\n".join(lines)
+
+
+class LLMProvider:
+    name = "base"
+
+    def is_configured(self) -> bool:
+        return True
+
+    async def startup(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stream(self, model: Optional[str], messages: List[dict]) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        self._genai = None
+        self._models = {}
+        self.resolver = ModelResolver(
+            self._list_models,
+            GEMINI_CANDIDATE_MODELS,
+            ttl=float(os.getenv("GEMINI_MODELS_TTL", 600)),
+            failure_ttl=float(os.getenv("GEMINI_MODEL_FAILURE_TTL", 300)),
+        )
+        # Models tried per request before giving up
+        self.max_attempts = int(os.getenv("GEMINI_MAX_MODEL_ATTEMPTS") or 3)
+
+    def is_configured(self):
+        return bool(self.api_key)
+
+    async def startup(self):
+        if self._genai is None and self.api_key:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+            self.resolver.start()
+
+    async def shutdown(self):
+        await self.resolver.stop()
+
+    def _list_models(self):
+        return [
+            m.name.split("/", 1)[-1]
+            for m in self._genai.list_models()
+            if 'generateContent' in m.supported_generation_methods
+        ]
+
+    def _model(self, model_name):
+        model = self._models.get(model_name)
+        if model is None:
+            # Only names from the resolver get here; forget models no longer listed,
+            # so this holds at most one per known model
+            known = set(self.resolver.known())
+            for name in [name for name in self._models if name not in known]:
+                del self._models[name]
+            model = self._models[model_name] = self._genai.GenerativeModel(model_name)
+        return model
+
+    async def _open(self, model_name, prompt):
+        """Start a generation and wait for its first chunk, so a retired model fails here."""
+        response_stream = await self._model(model_name).generate_content_async(prompt, stream=True)
+        chunks = response_stream.__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return first, chunks
+
+    async def stream(self, model, messages):
+        if not self.api_key:
+            raise ProviderError("Configuration Error: GEMINI_API_KEY is missing in Vercel. Please add it to Settings -> Environment Variables.")
+        await self.startup()
+        from google.api_core import exceptions as google_exceptions
+        full_prompt = flatten_messages(messages)
+        candidate_models = self.resolver.resolve(model)[:self.max_attempts]
+
+        opened = None
+        last_error = None
+        working_model_name = None
+        tried = []
+        for model_name in candidate_models:
+            tried.append(model_name)
+            try:
+                opened = await self._open(model_name, full_prompt)
+                working_model_name = model_name
+                break
+            except google_exceptions.NotFound as e:
+                # The model is retired or not offered to this key: skip it for a while, try the next
+                self.resolver.mark_failed(model_name, e)
+                last_error = e
+            except Exception as e:
+                # Network, quota and key errors are not about the model; another
+                # one would fail the same way
+                last_error = e
+                break
+
+        if opened is None:
+            steps = [f"We tried these models: {', '.join(tried) or 'none available'}"]
+            skipped = self.resolver.report()
+            if skipped:
+                steps.append("Recently failed models were skipped:\n" + "\n".join(f"   - {name}: {reason}" for name, reason in skipped.items()))
+            steps.append(f"All failed. Last error: {str(last_error)}")
+            error_msg = "TitanBot Cloud Error: Could not connect to Google Gemini.\n\n"
+            error_msg += "".join(f"{i}. {step}\n" for i, step in enumerate(steps, 1))
+            error_msg += "\nPlease check your GEMINI_API_KEY is correct and has access to Generative Language API."
+            raise ProviderError(error_msg)
+
+        self.resolver.mark_ok(working_model_name)
+        first, chunks = opened
+        try:
+            if first is not None and first.text:
+                yield first.text
+            last = first
+            async for chunk in chunks:
+                last = chunk
+                if chunk.text:
+                    yield chunk.text
+            # The final chunk carries the token counts for the whole response
+            metadata = getattr(last, "usage_metadata", None)
+            if metadata is not None:
+                usage.report(metadata.prompt_token_count, metadata.candidates_token_count)
+        except Exception as stream_error:
+            raise ProviderError(f"Error streaming content from {working_model_name}: {str(stream_error)}")
+
+
+class OllamaProvider(LLMProvider):
+    """A local Ollama daemon, reached through InferenceScheduler (queueing,
+    parallelism limit, coalescing of identical prompts). Every request carries
+    OLLAMA_KEEP_ALIVE so the model stays loaded between chats, and the models in
+    OLLAMA_PRELOAD_MODELS are loaded in the background at startup.
+    """
+
+    name = "ollama"
+
+    def __init__(self, host: Optional[str] = None):
+        self.host = host or os.getenv("OLLAMA_HOST")
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.preload_models = [m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", "").split(",") if m.strip()]
+        self._client = None
+        self._preload_tasks = []
+        self.scheduler = InferenceScheduler(self._generate)
+
+    def is_configured(self):
+        return bool(self.host)
+
+    async def startup(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(host=self.host)
+            loop = asyncio.get_running_loop()
+            self._preload_tasks = [loop.create_task(self._preload(model)) for model in self.preload_models]
+
+    async def shutdown(self):
+        for task in self._preload_tasks:
+            task.cancel()
+        self._preload_tasks = []
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _preload(self, model):
+        # A chat with no messages just loads the model
+        try:
+            await self._client.chat(model=model, messages=[], keep_alive=self.keep_alive)
+        except Exception:
+            pass # the first real request will load it (and report any error)
+
+    async def _generate(self, model, messages):
+        await self.startup()
+        response = await self._client.chat(model=model, messages=messages, stream=True, keep_alive=self.keep_alive)
+        async for part in response:
+            content = part["message"]["content"]
+            if content:
+                yield content
+            if part.get("done"):
+                usage.report(part.get("prompt_eval_count"), part.get("eval_count"))
+
+    async def stream(self, model, messages):
+        try:
+            async for content in self.scheduler.stream(model or "llama3.2", messages):
+                yield content
+        except SchedulerBusy:
+            raise ProviderError("The local model is busy, please try again shortly.")
+
+
+DEFAULT_OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """Any server speaking the OpenAI chat completions API (OpenAI, vLLM, LM Studio, ...)."""
+
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        # Blank values (as in .env.example) mean unset
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY") or None
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        # Ask for token counts in the last chunk; on by default only for api.openai.com,
+        # since not every compatible server accepts stream_options
+        self.stream_usage = (os.getenv("OPENAI_STREAM_USAGE") or ("0" if self.base_url else "1")).lower() in ("1", "true", "yes")
+        self._client = None
+
+    def is_configured(self):
+        return bool(self.api_key or self.base_url)
+
+    async def startup(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            # Passed explicitly: given None, the client reads OPENAI_BASE_URL itself and keeps a blank one
+            self._client = AsyncOpenAI(api_key=self.api_key or "not-needed", base_url=self.base_url or DEFAULT_OPENAI_BASE_URL)
+
+    async def shutdown(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def stream(self, model, messages):
+        await self.startup()
+        options = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        response = await self._client.chat.completions.create(model=model or "gpt-4o-mini", messages=messages, stream=True, **options)
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None) is not None:
+                usage.report(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic offline provider for load tests and local development.
+
+    FAKE_LLM_TOKENS pads every reply to that many tokens and FAKE_LLM_DELAY
+    sleeps between tokens to mimic a real model's generation speed.
+    """
+
+    name = "fake"
+
+    def __init__(self, tokens: Optional[int] = None, delay: Optional[float] = None):
+        self.tokens = tokens if tokens is not None else int(os.getenv("FAKE_LLM_TOKENS", 0))
+        self.delay = delay if delay is not None else float(os.getenv("FAKE_LLM_DELAY", 0))
+
+    async def stream(self, model, messages):
+        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        words = f"[{model or self.name}] You said: {last_user}".split()
+        words += [f"token{i}" for i in range(len(words), self.tokens)]
+        for word in words:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield word + " "
+        # One token per word, like the replies themselves
+        usage.report(sum(len(m["content"].split()) for m in messages), len(words))
+
+
+class ProviderRegistry:
+    """Routes a ChatRequest.model string to a provider and the model name to use.
+
+    Accepts explicit "provider:model" (e.g. "ollama:llama3.2", "fake") or a bare
+    model name matched by family prefix. Models for an unconfigured provider, and
+    names we do not recognise, go to DEFAULT_LLM_PROVIDER.
+    """
+
+    def __init__(self, default_provider: Optional[str] = None):
+        self.default_provider = default_provider or os.getenv("DEFAULT_LLM_PROVIDER", "gemini")
+        self.providers: Dict[str, LLMProvider] = {}
+
+    def register(self, provider: LLMProvider):
+        self.providers[provider.name] = provider
+
+    async def startup(self):
+        for provider in self.providers.values():
+            if provider.is_configured():
+                await provider.startup()
+
+    async def shutdown(self):
+        for provider in self.providers.values():
+            await provider.shutdown()
+
+    def _match(self, model: str) -> Tuple[Optional[str], Optional[str]]:
+        prefix, sep, rest = model.partition(":")
+        if sep and prefix in self.providers:
+            return prefix, rest or None
+        if model in self.providers:
+            return model, None
+        lowered = model.lower()
+        if lowered.startswith("gemini"):
+            return "gemini", model
+        if lowered.startswith(OPENAI_MODEL_PREFIXES):
+            return "openai", model
+        if lowered.startswith(OLLAMA_MODEL_PREFIXES):
+            return "ollama", model
+        return None, None
+
+    def resolve(self, model: Optional[str]) -> Tuple[LLMProvider, Optional[str]]:
+        name, model_name = self._match(model or "")
+        provider = self.providers.get(name)
+        if provider is None or not provider.is_configured():
+            return self.providers[self.default_provider], None
+        return provider, model_name
+
+
+def create_registry() -> ProviderRegistry:
+    registry = ProviderRegistry()
+    for provider in (GeminiProvider(), OllamaProvider(), OpenAICompatibleProvider(), FakeProvider()):
+        registry.register(provider)
+    return registry
+
+
+registry = create_registry()
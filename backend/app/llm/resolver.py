@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Remembers which upstream models work so a chat request does not re-probe
+# retired models on every message. Discovery runs on a background timer; the
+# request path only ever reads the cached answer.
+
+
+class ModelResolver:
+    """Orders candidate models for a provider using cached availability.
+
+    - ``list_models`` is a blocking callable returning the model names the
+      account can use; it runs in a worker thread every ``ttl`` seconds.
+      Until the first listing arrives the static ``candidates`` are used.
+    - A requested model is only tried if it is listed (or, before the first
+      listing, one of the candidates), so client-supplied names never reach
+      the upstream API or the maps below.
+    - Models that fail with a permanent error are skipped for
+      ``failure_ttl`` seconds and the reason is kept for error reports; at
+      most ``max_failures`` are remembered.
+    - The last model that streamed successfully is tried first.
+    """
+
+    def __init__(self, list_models: Callable[[], List[str]], candidates: List[str],
+                 ttl: float = 600, failure_ttl: float = 300, max_failures: int = 64):
+        self.list_models = list_models
+        self.candidates = list(candidates)
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_failures = max_failures
+        self.available: Optional[List[str]] = None
+        self.refreshed_at = 0.0
+        self.preferred: Optional[str] = None
+        self.failures: Dict[str, Tuple[str, float]] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.available is None or time.monotonic() - self.refreshed_at > self.ttl
+
+    async def refresh(self) -> List[str]:
+        async with self._refresh_lock:
+            if not self.is_stale():
+                return self.available
+            self.available = await asyncio.to_thread(self.list_models)
+            self.refreshed_at = time.monotonic()
+            return self.available
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep serving the last known list and retry sooner.
+                await asyncio.sleep(min(self.ttl, 30))
+                continue
+            await asyncio.sleep(self.ttl)
+
+    async def _refresh_once(self):
+        try:
+            await self.refresh()
+        except Exception:
+            pass
+        finally:
+            self._refresh_task = None
+
+    def start(self):
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def failure_reason(self, model: str) -> Optional[str]:
+        failure = self.failures.get(model)
+        if failure is None:
+            return None
+        reason, until = failure
+        if time.monotonic() >= until:
+            del self.failures[model]
+            return None
+        return reason
+
+    def known(self) -> List[str]:
+        """The model names worth trying: the listing, or the candidates until there is one."""
+        return self.candidates if self.available is None else self.available
+
+    def mark_failed(self, model: str, error: Exception):
+        now = time.monotonic()
+        for name in [name for name, (_, until) in self.failures.items() if now >= until]:
+            del self.failures[name]
+        self.failures.pop(model, None)
+        while len(self.failures) >= self.max_failures:
+            # Oldest first (insertion order)
+            del self.failures[next(iter(self.failures))]
+        self.failures[model] = (str(error), now + self.failure_ttl)
+        if self.preferred == model:
+            self.preferred = None
+
+    def mark_ok(self, model: str):
+        self.failures.pop(model, None)
+        self.preferred = model
+
+    def resolve(self, requested: Optional[str] = None) -> List[str]:
+        """Return the models worth trying, best first, without any network calls."""
+        known = set(self.known())
+        ordered = [m for m in (requested, self.preferred, *self.candidates) if m in known]
+        if self.available is not None:
+            ordered += self.available
+        if self.is_stale() and self._refresh_task is None:
+            # No background loop (lifespan hooks did not run): refresh once, off-path.
+            self._refresh_task = asyncio.get_running_loop().create_task(self._refresh_once())
+
+        seen = set()
+        result = []
+        for model in ordered:
+            if model not in seen and self.failure_reason(model) is None:
+                seen.add(model)
+                result.append(model)
+        return result
+
+    def report(self) -> Dict[str, str]:
+        """Known models currently being skipped and why."""
+        known = set(self.known())
+        return {model: reason for model in list(self.failures)
+                if model in known and (reason := self.failure_reason(model))}
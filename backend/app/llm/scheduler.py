@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional
+
+# Scheduling for a local Ollama daemon, which runs one (or a few) generations
+# efficiently and thrashes when more arrive or the model keeps changing:
+#   - requests wait in a FIFO queue per model; when a slot frees, the model that
+#     just ran goes first if it has waiters, otherwise the longest-waiting head;
+#   - at most OLLAMA_MAX_PARALLEL generations run at once;
+#   - a request identical to one already queued or running (same model and
+#     messages) does not start a second generation: it subscribes to the
+#     first one and gets the same chunks, from the beginning;
+#   - a generation nobody is listening to any more is dropped from the queue
+#     or cancelled.
+# At most OLLAMA_MAX_QUEUE requests may wait; beyond that SchedulerBusy is raised.
+
+OLLAMA_MAX_PARALLEL = int(os.getenv("OLLAMA_MAX_PARALLEL", 1))
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", 100))
+
+
+class SchedulerBusy(Exception):
+    """The queue is full."""
+
+
+def job_key(model: str, messages: List[dict]) -> str:
+    return hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+
+
+class _Job:
+    def __init__(self, key: str, model: str, messages: List[dict]):
+        self.key = key
+        self.model = model
+        self.messages = messages
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.submitted_at = time.monotonic()
+        # The submitter's context, so the generation runs as part of its request
+        # (e.g. reports token usage to it) whichever job's completion dispatches it
+        self.context = contextvars.copy_context()
+        self.task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+
+class InferenceScheduler:
+    def __init__(self, generate: Callable[[str, List[dict]], AsyncIterator[str]],
+                 max_parallel: int = OLLAMA_MAX_PARALLEL, max_queue: int = OLLAMA_MAX_QUEUE):
+        """``generate(model, messages)`` is the raw, unscheduled async chunk iterator."""
+        self.generate = generate
+        self.max_parallel = max(1, max_parallel)
+        self.max_queue = max_queue
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._inflight: Dict[str, _Job] = {}
+        self._running = 0
+        self._last_model: Optional[str] = None
+        # Metrics
+        self.submitted = 0
+        self.coalesced = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def stream(self, model: str, messages: List[dict]) -> AsyncIterator[str]:
+        key = job_key(model, messages)
+        job = self._inflight.get(key)
+        if job is None:
+            if self.queued() >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerBusy()
+            job = self._inflight[key] = _Job(key, model, messages)
+            self._queues.setdefault(model, deque()).append(job)
+            self.submitted += 1
+            self._dispatch()
+        else:
+            self.coalesced += 1
+
+        job.subscribers += 1
+        cursor = 0
+        try:
+            while True:
+                wakeup = job._wakeup
+                while cursor < len(job.chunks):
+                    yield job.chunks[cursor]
+                    cursor += 1
+                if job.done:
+                    if job.error is not None:
+                        raise job.error
+                    return
+                await wakeup.wait()
+        finally:
+            job.subscribers -= 1
+            if not job.subscribers and not job.done:
+                self._abandon(job)
+
+    def _next_job(self) -> Optional[_Job]:
+        if not self._queues:
+            return None
+        model = self._last_model if self._last_model in self._queues else \
+            min(self._queues, key=lambda name: self._queues[name][0].submitted_at)
+        queue = self._queues[model]
+        job = queue.popleft()
+        if not queue:
+            del self._queues[model]
+        return job
+
+    def _dispatch(self):
+        while self._running < self.max_parallel:
+            job = self._next_job()
+            if job is None:
+                return
+            wait = time.monotonic() - job.submitted_at
+            self.started += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._running += 1
+            self._last_model = job.model
+            job.task = asyncio.get_running_loop().create_task(self._run(job), context=job.context)
+
+    async def _run(self, job: _Job):
+        try:
+            async for chunk in self.generate(job.model, job.messages):
+                job.chunks.append(chunk)
+                job.notify()
+            self.completed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.error = e
+            self.failed += 1
+        finally:
+            job.done = True
+            job.notify()
+            if self._inflight.get(job.key) is job:
+                del self._inflight[job.key]
+            self._running -= 1
+            self._dispatch()
+
+    def _abandon(self, job: _Job):
+        if job.task is not None:
+            job.task.cancel()
+            return
+        # Still queued: take it out without ever running it
+        queue = self._queues.get(job.model)
+        if queue is not None and job in queue:
+            queue.remove(job)
+            if not queue:
+                del self._queues[job.model]
+        job.done = True
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": self.queued(),
+            "queued_by_model": {model: len(queue) for model, queue in self._queues.items()},
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_seconds": self.total_wait / self.started if self.started else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Coroutine, List, Optional
+
+# A chat reply is generated by a background job, which publishes Server-Sent
+# Events into a per-stream buffer; HTTP responses subscribe to that buffer. This
+# keeps generation independent of any one connection:
+#   - a client that drops can reconnect with Last-Event-ID and get the events it
+#     missed replayed, then follow the rest live; any number of clients (tabs)
+#     can follow the same stream, all fed by one generation;
+#   - once no client has been attached for SSE_DISCONNECT_GRACE seconds the
+#     job is cancelled, which closes the upstream provider stream - unless it
+#     was started detached, in which case it runs to the end and its reply is
+#     saved whether or not anyone is listening;
+#   - idle connections get a comment line every SSE_HEARTBEAT_INTERVAL seconds
+#     so proxies do not time them out.
+# The buffer holds the last SSE_BUFFER_EVENTS events. A client that needs older
+# ones first gets a "snapshot" event with the reply text so far, which replaces
+# whatever text it had, and continues from there.
+#
+# Finished streams are kept for SSE_RESUME_TTL seconds. Buffers live in the
+# worker's memory, so a resume has to reach the worker that ran the stream.
+
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", 15))
+SSE_RESUME_TTL = float(os.getenv("SSE_RESUME_TTL", 60))
+SSE_DISCONNECT_GRACE = float(os.getenv("SSE_DISCONNECT_GRACE", 2))
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", 1000))
+SSE_BUFFER_EVENTS = int(os.getenv("SSE_BUFFER_EVENTS", 512))
+CHAT_JOB_SHUTDOWN_GRACE = float(os.getenv("CHAT_JOB_SHUTDOWN_GRACE", 10))
+
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    """Render one SSE event; data is JSON so it never contains a bare newline."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+class TaskRunner:
+    """Runs generation jobs as tasks on this worker's event loop.
+
+    start() and shutdown() are the whole interface the streams use, so a runner
+    that hands jobs to a pool of workers can stand in for it.
+    """
+
+    def __init__(self):
+        self._tasks = set()
+
+    def start(self, job: Coroutine) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(job)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    async def shutdown(self, timeout: float = CHAT_JOB_SHUTDOWN_GRACE):
+        """Let running jobs finish for up to ``timeout`` seconds, then cancel the rest."""
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+class ChatStream:
+    def __init__(self, stream_id: str, user_id: int, session_id: int, detached: bool = False,
+                 runner: Optional[TaskRunner] = None, buffer_events: int = SSE_BUFFER_EVENTS,
+                 heartbeat_interval: float = SSE_HEARTBEAT_INTERVAL, disconnect_grace: float = SSE_DISCONNECT_GRACE):
+        self.stream_id = stream_id
+        self.user_id = user_id
+        self.session_id = session_id
+        self.detached = detached
+        self.runner = runner or TaskRunner()
+        self.heartbeat_interval = heartbeat_interval
+        self.disconnect_grace = disconnect_grace
+        self.events = deque(maxlen=max(1, buffer_events))  # (rendered event, token text or None)
+        self.last_id = 0  # id of the newest event; the buffer holds the ids after first_id - 1
+        self._dropped_text: List[str] = []  # token text that has left the buffer
+        self.finished = False
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_handle: Optional[asyncio.TimerHandle] = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def first_id(self) -> int:
+        return self.last_id - len(self.events) + 1
+
+    def start(self, producer):
+        """Run ``producer`` (a coroutine that publishes this stream's events) as a job."""
+        self._task = self.runner.start(producer)
+
+    def publish(self, event: str, data: dict):
+        if len(self.events) == self.events.maxlen:
+            _, text = self.events[0]
+            if text:
+                self._dropped_text.append(text)
+        self.last_id += 1
+        self.events.append((format_event(event, data, self.last_id), data.get("text") if event == "token" else None))
+        self._notify()
+
+    def finish(self):
+        self.finished = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def _notify(self):
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def _unattended(self):
+        self._cancel_handle = None
+        if not self.subscribers:
+            self.cancel()
+
+    async def subscribe(self, after: int = 0) -> AsyncIterator[str]:
+        """Yield events with an id above ``after``, then follow the stream until it finishes."""
+        self.subscribers += 1
+        if self._cancel_handle is not None:
+            self._cancel_handle.cancel()
+            self._cancel_handle = None
+        cursor = max(0, after)  # id of the last event this subscriber has
+        try:
+            while True:
+                wakeup = self._wakeup
+                while cursor < self.last_id:
+                    if cursor < self.first_id - 1:
+                        # What it is missing has left the buffer (it is new, or too
+                        # slow to keep up): send the text so far instead
+                        cursor = self.first_id - 1
+                        if self._dropped_text:
+                            yield format_event("snapshot", {"text": "".join(self._dropped_text)}, cursor)
+                        continue
+                    yield self.events[cursor - self.first_id + 1][0]
+                    cursor += 1
+                if self.finished:
+                    return
+                try:
+                    await asyncio.wait_for(wakeup.wait(), self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            # Runs when the client disconnects, too
+            self.subscribers -= 1
+            if not self.subscribers and not self.finished and not self.detached:
+                if self.disconnect_grace <= 0:
+                    self.cancel()
+                elif self._cancel_handle is None:
+                    self._cancel_handle = asyncio.get_running_loop().call_later(self.disconnect_grace, self._unattended)
+
+
+class StreamRegistry:
+    def __init__(self, resume_ttl: float = SSE_RESUME_TTL, max_streams: int = SSE_MAX_STREAMS,
+                 runner: Optional[TaskRunner] = None):
+        self.resume_ttl = resume_ttl
+        self.max_streams = max_streams
+        self.runner = runner or TaskRunner()
+        self._streams: "OrderedDict[str, ChatStream]" = OrderedDict()
+
+    def create(self, user_id: int, session_id: int, detached: bool = False) -> ChatStream:
+        self._prune()
+        stream = ChatStream(secrets.token_urlsafe(12), user_id, session_id, detached=detached, runner=self.runner)
+        self._streams[stream.stream_id] = stream
+        return stream
+
+    def get(self, stream_id: str) -> Optional[ChatStream]:
+        self._prune()
+        return self._streams.get(stream_id)
+
+    def for_user(self, user_id: int) -> List[ChatStream]:
+        self._prune()
+        return [stream for stream in self._streams.values() if stream.user_id == user_id]
+
+    def _prune(self):
+        now = time.monotonic()
+        over = len(self._streams) - self.max_streams + 1
+        for stream_id, stream in list(self._streams.items()):
+            if not stream.finished:
+                continue
+            if over > 0 or now - stream.finished_at > self.resume_ttl:
+                del self._streams[stream_id]
+                over -= 1
+
+    async def shutdown(self):
+        await self.runner.shutdown()
+
+
+chat_streams = StreamRegistry()
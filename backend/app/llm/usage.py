@@ -0,0 +1,32 @@
+from contextvars import ContextVar
+from typing import Optional
+
+# Token counts reported by the provider for the generation running in this
+# task. The chat handler calls capture() before streaming; providers call
+# report() once the response tells them the counts. Tasks started from inside
+# the generation (e.g. the Ollama scheduler's) inherit the same dict. A
+# provider that reports nothing leaves it empty and the caller falls back to
+# estimates. A reply served from the completion cache is marked with
+# mark_cached(), since no provider was called for it.
+
+_current: ContextVar[Optional[dict]] = ContextVar("llm_usage", default=None)
+
+
+def capture() -> dict:
+    """Start collecting usage for this task; the returned dict fills in as providers report."""
+    usage = {}
+    _current.set(usage)
+    return usage
+
+
+def report(prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+    usage = _current.get()
+    if usage is not None and prompt_tokens is not None and completion_tokens is not None:
+        usage["prompt_tokens"] = int(prompt_tokens)
+        usage["completion_tokens"] = int(completion_tokens)
+
+
+def mark_cached():
+    usage = _current.get()
+    if usage is not None:
+        usage["cached"] = True
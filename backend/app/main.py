@@ -1,13 +1,27 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
+import json
 import os
 
 # Load environment variables
 load_dotenv()
 
 from app.routes import auth, chat, users
-from app.database.database import database
+from app.database.database import engine, DB_AUTO_CREATE
+from app.database import query_counter
+from app import metrics
+from app.database.writer import message_writer
+from app.database.usage import usage_recorder
+from app.database.archive import session_archiver
+from app.llm.providers import registry as llm_registry
+from app.llm.cache import completion_cache
+from app.security.passwords import password_hasher
+from app.security.google import google_verifier
+from app.security.user_cache import user_cache
+from app.security.rate_limit import chat_limiter
+from app.llm.streams import chat_streams
 
 app = FastAPI(
     title="TitanBot API",
@@ -22,21 +36,91 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Stream-Id", "X-Session-Id"],  # read by the chat client to resume streams
 )
 
+# Debug mode: report SQL statements per request in an X-DB-Queries header.
+# For streaming endpoints this covers everything before the first byte.
+if os.getenv("DEBUG"):
+    query_counter.install(engine)
+
+    @app.middleware("http")
+    async def count_queries(request, call_next):
+        with query_counter.track() as counter:
+            response = await call_next(request)
+        response.headers["X-DB-Queries"] = str(counter.count)
+        return response
+
+# Metrics (METRICS=1): request and SQL timing, plus state owned by other modules
+# read at scrape time. Scraped from /metrics, optionally behind METRICS_TOKEN.
+if metrics.ENABLED:
+    metrics.install(app, engine)
+    metrics.registry.collector("Password hashing pool state.", lambda: metrics.stat_metrics(
+        "titanbot_password_hasher_", password_hasher.stats(), counters=("completed", "rejected")))
+    metrics.registry.collector("Completion cache state.", lambda: metrics.stat_metrics(
+        "titanbot_completion_cache_", completion_cache.stats(),
+        counters=("hits", "misses", "stores", "errors", "evictions")))
+    metrics.registry.collector("Authenticated user cache state.", lambda: {
+        "titanbot_user_cache_hits_total": user_cache.hits,
+        "titanbot_user_cache_misses_total": user_cache.misses,
+    })
+    metrics.registry.collector("Local Ollama scheduler state.", lambda: metrics.stat_metrics(
+        "titanbot_ollama_", llm_registry.providers["ollama"].scheduler.stats(),
+        counters=("submitted", "coalesced", "completed", "failed", "rejected")))
+    metrics.registry.collector("Chat admission control state.", lambda: {
+        "titanbot_chat_rate_limited_total": chat_limiter.rejected,
+        "titanbot_chat_rate_limiter_errors_total": chat_limiter.errors,
+        "titanbot_chat_streams_buffered": len(chat_streams._streams),
+        "titanbot_chat_jobs_running": chat_streams.runner.running,
+    })
+    metrics.registry.collector("Write-behind message writer state.", lambda: {
+        "titanbot_message_writer_retries_total": message_writer.retried,
+        "titanbot_message_writer_dropped_turns_total": message_writer.dropped,
+    })
+    metrics.registry.collector("Cold-session archival since startup.", lambda: metrics.stat_metrics(
+        "titanbot_archive_", session_archiver.stats(),
+        counters=("sessions_archived", "messages_archived", "raw_bytes", "stored_bytes", "sessions_rehydrated")))
+    metrics.registry.collector("Token usage recorder state.", lambda: metrics.stat_metrics(
+        "titanbot_usage_", usage_recorder.stats(), counters=("flushed_rows",)))
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: str = Header(None)):
+    if not metrics.ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not metrics.authorized(authorization):
+        raise HTTPException(status_code=401, detail="Not authorized")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Database startup event
+# The schema is managed by Alembic (alembic upgrade head), not at startup, and the
+# connection pool opens its first connection on the first query.
 @app.on_event("startup")
 async def startup():
-    await database.connect()
-    # Create tables
-    from app.database.database import engine, Base
-    from app.database import models # Ensure models are imported
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_AUTO_CREATE:
+        # Only for throwaway databases that cannot be migrated ahead of time
+        from app.database.database import Base
+        from app.database import models # Ensure models are imported
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    await llm_registry.startup()
+    message_writer.start()
+    usage_recorder.start()
+    session_archiver.start()
 
 @app.on_event("shutdown")
 async def shutdown():
-    await database.disconnect()
+    # Running replies get a grace period to finish; whatever is cut off is still
+    # saved, so the writer stops after them
+    await session_archiver.stop()
+    await chat_streams.shutdown()
+    await message_writer.stop()
+    await usage_recorder.stop()
+    await engine.dispose()
+    await llm_registry.shutdown()
+    await completion_cache.close()
+    await chat_limiter.close()
+    password_hasher.shutdown()
+    await google_verifier.aclose()
 
 # Include Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -46,3 +130,16 @@ app.include_router(users.router, prefix="/api/users", tags=["Users"])
 @app.get("/")
 async def root():
     return {"message": "TitanBot API is running"}
+
+# Serve the OpenAPI schema from the copy written by export_openapi.py instead of
+# building it from every route on a cold worker's first /docs request. Set
+# OPENAPI_SCHEMA_PATH to an empty string to always build it at runtime.
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH", os.path.join(os.path.dirname(__file__), "openapi.json"))
+
+def openapi():
+    if app.openapi_schema is None and OPENAPI_SCHEMA_PATH and os.path.exists(OPENAPI_SCHEMA_PATH):
+        with open(OPENAPI_SCHEMA_PATH) as f:
+            app.openapi_schema = json.load(f)
+    return FastAPI.openapi(app)
+
+app.openapi = openapi
@@ -0,0 +1,194 @@
+import bisect
+import os
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event
+
+# Latency histograms and counters exported in the Prometheus text format at
+# GET /metrics. Off unless METRICS=1: every recording call starts with a check
+# of the module-level ENABLED flag, and the HTTP middleware and SQL timing hooks
+# are only installed when it is set, so a disabled build pays one attribute
+# lookup per timer. Values are per process; scrape each worker.
+#
+# Values that already live elsewhere (pool queues, cache stats) are registered
+# as collectors and read at scrape time: gauges, or counters when named *_total.
+
+ENABLED = os.getenv("METRICS", "").lower() in ("1", "true", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, list] = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels):
+        if not ENABLED:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        bucket = bisect.bisect_left(self.buckets, value)
+        if bucket < len(self.buckets):
+            series[bucket] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (bound,))} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        if not ENABLED:
+            return
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Collector:
+    """Values read at scrape time from ``fn``, which returns {metric name: value}.
+    Names ending in _total are counters (totals since startup), the rest gauges."""
+
+    def __init__(self, help: str, fn: Callable[[], Dict[str, float]]):
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        for name, value in self.fn().items():
+            yield f"# HELP {name} {self.help}"
+            yield f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}"
+            yield f"{name} {value}"
+
+
+def stat_metrics(prefix: str, stats: Dict[str, float], counters: Iterable[str] = ()) -> Dict[str, float]:
+    """A component's stats() as collector values: prefixed names, and _total on the ``counters``."""
+    counters = set(counters)
+    return {f"{prefix}{key}_total" if key in counters else f"{prefix}{key}": value
+            for key, value in stats.items() if not isinstance(value, dict)}
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def collector(self, help: str, fn: Callable[[], Dict[str, float]]):
+        self.register(Collector(help, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "titanbot_http_request_duration_seconds", "Time to the response headers, by route.", ("method", "route", "status"))
+db_query_seconds = registry.histogram(
+    "titanbot_db_query_duration_seconds", "SQL statement execution time.", ("operation",))
+chat_setup_seconds = registry.histogram(
+    "titanbot_chat_setup_seconds", "send_message work before streaming starts.", ("phase",))
+chat_first_token_seconds = registry.histogram(
+    "titanbot_chat_time_to_first_token_seconds", "From generation start to the first token.", ("provider", "model"))
+chat_stream_seconds = registry.histogram(
+    "titanbot_chat_stream_duration_seconds", "Full generation time.", ("provider", "model", "finish_reason"))
+chat_chunks_per_second = registry.histogram(
+    "titanbot_chat_chunks_per_second", "Streamed chunks per second after the first.", ("provider", "model"), RATE_BUCKETS)
+chat_tokens = registry.counter(
+    "titanbot_chat_completion_tokens_total", "Completion tokens generated, as reported by the provider or estimated when it does not.", ("provider", "model"))
+chat_rehydrate_seconds = registry.histogram(
+    "titanbot_chat_rehydrate_seconds", "Restoring an archived session's messages.")
+auth_seconds = registry.histogram(
+    "titanbot_auth_seconds", "Authentication steps.", ("step",))
+
+
+def elapsed(started: float) -> float:
+    return time.perf_counter() - started
+
+
+# SQL timing, installed by install() when metrics are enabled
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    db_query_seconds.observe(elapsed(context._metrics_started), statement.lstrip().split(None, 1)[0].upper())
+
+
+def install(app, engine):
+    """Add the HTTP timing middleware and SQL timing hooks (only call when ENABLED)."""
+    if not event.contains(engine.sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.middleware("http")
+    async def time_requests(request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        http_request_seconds.observe(elapsed(started), request.method, _route_label(request.scope), response.status_code)
+        return response
+
+
+def _route_label(scope) -> str:
+    """The request path with its path parameters put back as {name}, so ids never become labels."""
+    if "route" not in scope:
+        return "unmatched"
+    placeholders = {str(value): f"{{{name}}}" for name, value in scope.get("path_params", {}).items()}
+    return "/".join(placeholders.get(segment, segment) for segment in scope["path"].split("/"))
+
+
+def render() -> str:
+    return registry.render()
+
+
+def authorized(authorization: Optional[str]) -> bool:
+    return not METRICS_TOKEN or authorization == f"Bearer {METRICS_TOKEN}"
@@ -6,10 +6,12 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from typing import Optional
 import os
-import httpx
-from passlib.context import CryptContext
+import time
 from app.database.database import get_db
 from app.database.models import User
+from app.security.passwords import password_hasher, PasswordHasherBusy
+from app.security.google import google_verifier, InvalidGoogleToken, GoogleVerifierUnavailable
+from app import metrics
 
 router = APIRouter()
 
@@ -18,8 +20,8 @@ SECRET_KEY = os.getenv("JWT_SECRET", "supersecretkey")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-
-import bcrypt
+# Development only: accept the frontend's mock Google token without verification
+GOOGLE_MOCK_LOGIN = os.getenv("GOOGLE_MOCK_LOGIN", "").lower() in ("1", "true", "yes")
 
 class Token(BaseModel):
     access_token: str
@@ -51,14 +53,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# Replaced passlib with direct bcrypt to avoid 72 byte limit error
-def verify_password(plain_password, hashed_password):
-    if not hashed_password:
-        return False
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
-def get_password_hash(password):
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Replaced passlib with direct bcrypt to avoid 72 byte limit error.
+# Hashing runs in a bounded worker pool so it never blocks the event loop.
+hasher_busy_exception = HTTPException(
+    status_code=503,
+    detail="Too many sign-ins in progress, please retry shortly",
+    headers={"Retry-After": "1"},
+)
+
+async def verify_password(plain_password, hashed_password):
+    started = time.perf_counter()
+    try:
+        return await password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception
+    finally:
+        metrics.auth_seconds.observe(metrics.elapsed(started), "password_verify")
+
+async def get_password_hash(password):
+    started = time.perf_counter()
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise hasher_busy_exception
+    finally:
+        metrics.auth_seconds.observe(metrics.elapsed(started), "password_hash")
 
 @router.post("/register", response_model=Token)
 async def register(request: UserRegisterRequest, db: AsyncSession = Depends(get_db)):
@@ -67,7 +86,7 @@ async def register(request: UserRegisterRequest, db: AsyncSession = Depends(get_
     if result.scalars().first():
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_pw = get_password_hash(request.password)
+    hashed_pw = await get_password_hash(request.password)
     user = User(
         email=request.email, 
         full_name=request.full_name,
@@ -89,7 +108,7 @@ async def login(request: UserLoginRequest, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == request.email))
     user = result.scalars().first()
     
-    if not user or not verify_password(request.password, user.hashed_password):
+    if not user or not await verify_password(request.password, user.hashed_password):
          raise HTTPException(status_code=400, detail="Incorrect email or password")
          
     access_token = create_access_token(
@@ -99,8 +118,8 @@ async def login(request: UserLoginRequest, db: AsyncSession = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 async def verify_google_token(token: str):
-    # DEVELOPMENT: Allow mock token
-    if token == "mock_google_token_123":
+    # DEVELOPMENT: Allow mock token, only when GOOGLE_MOCK_LOGIN is set
+    if GOOGLE_MOCK_LOGIN and token == "mock_google_token_123":
         return {
             "email": "test@example.com",
             "name": "Test User",
@@ -108,14 +127,15 @@ async def verify_google_token(token: str):
             "aud": GOOGLE_CLIENT_ID or "mock_client_id"
         }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"https://oauth2.googleapis.com/tokeninfo?id_token={token}")
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Invalid Google Token")
-        data = response.json()
-        if data["aud"] != GOOGLE_CLIENT_ID and GOOGLE_CLIENT_ID is not None:
-             pass
-        return data
+    started = time.perf_counter()
+    try:
+        return await google_verifier.verify(token)
+    except InvalidGoogleToken:
+        raise HTTPException(status_code=400, detail="Invalid Google Token")
+    except GoogleVerifierUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        metrics.auth_seconds.observe(metrics.elapsed(started), "google_verify")
 
 @router.post("/google", response_model=Token)
 async def google_login(request: GoogleLoginRequest, db: AsyncSession = Depends(get_db)):
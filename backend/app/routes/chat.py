@@ -1,14 +1,30 @@
-import os
-import ollama
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import base64
+import binascii
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Query, Header
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import String, and_, bindparam, insert, or_, type_coerce
 from sqlalchemy.future import select
 from pydantic import BaseModel
 from typing import List, Optional
+from datetime import datetime
 from app.database.database import get_db
 from app.database.models import User, ChatSession, Message
-from app.routes.users import get_current_user
+from app.database.writer import message_writer
+from app.database.search import search_messages
+from app.database.usage import usage_recorder
+from app.database.archive import session_archiver
+from app.routes.users import get_current_user, get_current_user_readonly
+from app.llm.context import build_context, estimate_tokens
+from app.llm.providers import registry as llm_registry, ProviderError
+from app.llm.streams import chat_streams, ChatStream
+from app.llm.cache import completion_cache
+from app.llm import usage
+from app.security.rate_limit import chat_limiter, retry_after_header
+from app import metrics
 
 router = APIRouter()
 
@@ -16,10 +32,45 @@ class ChatRequest(BaseModel):
     message: str
     session_id: Optional[int] = None
     model: str = "llama3.2" 
+    detach: bool = False # keep generating (and save the reply) even if every client disconnects
 
 class CreateSessionRequest(BaseModel):
     title: str
 
+class SessionItem(BaseModel):
+    id: int
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class SessionPage(BaseModel):
+    items: List[SessionItem]
+    next_cursor: Optional[str] = None
+
+class MessageItem(BaseModel):
+    id: Optional[int] = None # None until the write-behind queue has saved it
+    role: str
+    content: str
+    created_at: Optional[datetime] = None
+
+class MessagePage(BaseModel):
+    items: List[MessageItem]
+    next_cursor: Optional[str] = None
+
+class SearchHit(BaseModel):
+    message_id: int
+    session_id: int
+    session_title: Optional[str] = None
+    role: str
+    snippet: str
+    created_at: Optional[datetime] = None
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[int] = None
+    # Only the newest matches are ranked; when true, older ones were left out
+    truncated: bool = False
+
 @router.post("/sessions")
 async def create_session(
     request: CreateSessionRequest, 
@@ -32,27 +83,125 @@ async def create_session(
     await db.refresh(session)
     return session
 
-@router.get("/sessions")
+# Listing endpoints use keyset pagination: ``cursor`` is an opaque token holding
+# the sort key and id of the last item on the previous page, so pages never
+# repeat the OFFSET scan and always match the ORDER BY exactly - even if that
+# item has since moved (a session bumped by a new message) or gone. Rows are
+# selected as plain columns, skipping ORM object construction.
+
+def _sort_key(column):
+    # The timestamp as stored: SQLite keeps it as text, in more than one format
+    # depending on who wrote it, so the cursor compares against that exact text
+    return type_coerce(column, String).label("sort_key")
+
+def _encode_cursor(sort_key, row_id: int) -> str:
+    if isinstance(sort_key, datetime):
+        sort_key = sort_key.isoformat()
+    raw = json.dumps([sort_key, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, db: AsyncSession):
+    """Return (sort key to compare the column with, id) from a cursor made by _encode_cursor."""
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(sort_key, str) or not isinstance(row_id, int):
+            raise ValueError(cursor)
+        if db.get_bind().dialect.name == "sqlite":
+            return bindparam(None, sort_key, type_=String), row_id
+        return datetime.fromisoformat(sort_key), row_id
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/sessions", response_model=SessionPage)
 async def get_sessions(
-    user: User = Depends(get_current_user),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    since: Optional[datetime] = None,
+    user: User = Depends(get_current_user_readonly),
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(ChatSession).where(ChatSession.user_id == user.id).order_by(ChatSession.updated_at.desc()))
-    return result.scalars().all()
+    # Most recently updated first, on (updated_at, id). ``since`` returns only
+    # sessions updated after that time, for incremental sync.
+    query = (
+        select(ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at, _sort_key(ChatSession.updated_at))
+        .where(ChatSession.user_id == user.id)
+    )
+    if cursor is not None:
+        after_updated_at, after_id = _decode_cursor(cursor, db)
+        query = query.where(or_(
+            ChatSession.updated_at < after_updated_at,
+            and_(ChatSession.updated_at == after_updated_at, ChatSession.id < after_id),
+        ))
+    if since is not None:
+        query = query.where(ChatSession.updated_at > since)
+    result = await db.execute(query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = _encode_cursor(rows[limit - 1].sort_key, rows[limit - 1].id) if len(rows) > limit else None
+    items = [{"id": row.id, "title": row.title, "created_at": row.created_at, "updated_at": row.updated_at} for row in rows[:limit]]
+    return {"items": items, "next_cursor": next_cursor}
 
-@router.get("/sessions/{session_id}/messages")
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
 async def get_messages(
     session_id: int, 
-    user: User = Depends(get_current_user), 
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=1000),
+    since: Optional[datetime] = None,
+    user: User = Depends(get_current_user_readonly), 
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(ChatSession).where(ChatSession.id == session_id, ChatSession.user_id == user.id))
-    session = result.scalars().first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-        
-    result = await db.execute(select(Message).where(Message.session_id == session_id).order_by(Message.created_at.asc()))
-    return result.scalars().all()
+    # Chronological, on (created_at, id). The ownership check is part of the page
+    # query; it only runs on its own when the page comes back empty.
+    query = (
+        select(Message.id, Message.role, Message.content, Message.created_at, _sort_key(Message.created_at),
+               ChatSession.archived_at)
+        .join(ChatSession, ChatSession.id == Message.session_id)
+        .where(Message.session_id == session_id, ChatSession.user_id == user.id)
+    )
+    if cursor is not None:
+        after_created_at, after_id = _decode_cursor(cursor, db)
+        query = query.where(or_(
+            Message.created_at > after_created_at,
+            and_(Message.created_at == after_created_at, Message.id > after_id),
+        ))
+    if since is not None:
+        query = query.where(Message.created_at > since)
+    query = query.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    archived = bool(rows) and rows[0].archived_at is not None
+    if not rows:
+        result = await db.execute(select(ChatSession.archived_at).where(ChatSession.id == session_id, ChatSession.user_id == user.id))
+        session = result.first()
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        archived = session.archived_at is not None
+    if archived:
+        # Its messages were moved to the archive (see app.database.archive); put them back
+        await session_archiver.rehydrate(db, session_id)
+        rows = (await db.execute(query)).all()
+
+    items = [{"id": row.id, "role": row.role, "content": row.content, "created_at": row.created_at} for row in rows[:limit]]
+    next_cursor = _encode_cursor(rows[limit - 1].sort_key, rows[limit - 1].id) if len(rows) > limit else None
+    if next_cursor is None:
+        # Include the latest turn even if the write-behind queue has not flushed it yet
+        items.extend(message_writer.pending(session_id))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/search", response_model=SearchPage)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    user: User = Depends(get_current_user_readonly),
+    db: AsyncSession = Depends(get_db)
+):
+    # Ranked by relevance, so the cursor is the offset of the next page rather
+    # than a keyset anchor
+    offset = cursor or 0
+    hits, truncated = await search_messages(db, user.id, q, offset=offset, limit=limit + 1)
+    items = hits[:limit]
+    return {"items": items, "next_cursor": offset + limit if len(hits) > limit else None, "truncated": truncated}
 
 @router.post("/send")
 async def send_message(
@@ -60,33 +209,6 @@ async def send_message(
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    # 1. Get or Create Session
-    if request.session_id:
-        result = await db.execute(select(ChatSession).where(ChatSession.id == request.session_id, ChatSession.user_id == user.id))
-        session = result.scalars().first()
-        if not session:
-             raise HTTPException(status_code=404, detail="Session not found")
-    else:
-        session = ChatSession(user_id=user.id, title=request.message[:30])
-        db.add(session)
-        await db.commit()
-        await db.refresh(session)
-    
-    # Capture Session ID to avoid 'MissingGreenlet' on access after subsequent commits
-    current_session_id = session.id
-
-    # 2. Save User Message
-    user_msg = Message(session_id=current_session_id, role="user", content=request.message)
-    db.add(user_msg)
-    await db.commit()
-
-    # Fetch history
-    history_result = await db.execute(select(Message.role, Message.content).where(Message.session_id == current_session_id).order_by(Message.created_at.asc()))
-    history_rows = history_result.all()
-    
-    # Format history for Ollama
-    history_msgs = [{"role": row.role, "content": row.content} for row in history_rows]
-
     # Prepend System Prompt if not already present implicitly by model behavior
     # (Ollama models often have their own system prompts, but we can enforce one)
     SYSTEM_PROMPT = """You are TitanBot, an elite Technical AI Assistant specialized in Software Engineering, Coding, and Computer Science.
@@ -96,76 +218,173 @@ async def send_message(
     - Explain complex technical concepts clearly.
     - Debug errors with precision.
     """
-    
-    messages_payload = [{"role": "system", "content": SYSTEM_PROMPT}] + history_msgs
 
-    # 3. Stream Response
-    # 3. Stream Response
-    # 3. Stream Response (PURE CLOUD - GEMINI ONLY)
-    async def generate_response():
-        gemini_key = os.getenv("GEMINI_API_KEY")
-        if not gemini_key:
-             yield f"Configuration Error: GEMINI_API_KEY is missing in Vercel. Please add it to Settings -> Environment Variables."
-             return
-
-        import google.generativeai as genai
-        genai.configure(api_key=gemini_key)
-        
-        # Priority list: reliable flash first, then powerful pro, then legacy
-        candidate_models = ['gemini-1.5-flash', 'gemini-1.5-pro', 'gemini-1.0-pro', 'gemini-pro']
-        
-        response_stream = None
-        last_error = None
-        working_model_name = None
-
-        # Reconstruct prompt
-        full_prompt = f"{SYSTEM_PROMPT}\n\n"
-        for msg in history_msgs:
-            full_prompt += f"{msg['role'].upper()}: {msg['content']}\n"
-        full_prompt += f"USER: {request.message}\nASSISTANT:"
-
-        # Attempt 1: Try Standard Models
-        for model_name in candidate_models:
-            try:
-                model = genai.GenerativeModel(model_name)
-                response_stream = model.generate_content(full_prompt, stream=True)
-                working_model_name = model_name
-                break 
-            except Exception as e:
-                last_error = e
-                continue
-        
-        # Attempt 2: If all standard failed, try to find ANY available model from user account
-        if not response_stream:
-            try:
-                for m in genai.list_models():
-                    if 'generateContent' in m.supported_generation_methods:
-                         # Try this available model
-                         try:
-                             model = genai.GenerativeModel(m.name)
-                             response_stream = model.generate_content(full_prompt, stream=True)
-                             working_model_name = m.name
-                             break
-                         except:
-                             continue
-            except:
-                pass
-
-        # Stream or Fail
-        if response_stream:
-            try:
-                for chunk in response_stream:
-                    if chunk.text:
-                        yield chunk.text
-            except Exception as stream_error:
-                    yield f"Error streaming content from {working_model_name}: {str(stream_error)}"
+    # Admission control before any database work: the daily token quota, then
+    # per-user message rate and concurrent generations. The stream slot is
+    # released when generation ends.
+    if user.role != "admin":
+        wait = await usage_recorder.quota_wait(user.id)
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail="Daily token quota used up",
+                headers={"Retry-After": retry_after_header(wait)},
+            )
+    wait = await chat_limiter.admit(user.id)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many messages, please slow down",
+            headers={"Retry-After": retry_after_header(wait)},
+        )
+
+    started = time.perf_counter()
+    try:
+        # 1. Get or Create Session, and build context from the newest turns that fit the
+        # token budget (older ones live in the session summary). For an existing session
+        # the ownership check and history are one query. The user message, the reply and
+        # any summary update are persisted together once the stream finishes.
+        if request.session_id:
+            current_session_id = request.session_id
+            context = await build_context(
+                db, current_session_id, user.id, SYSTEM_PROMPT, request.message, message_writer.pending(current_session_id)
+            )
+            if context is None:
+                 raise HTTPException(status_code=404, detail="Session not found")
+            messages_payload, summary_update = context
         else:
-            # Failure Report
-            error_msg = f"TitanBot Cloud Error: Could not connect to Google Gemini.\n\n"
-            error_msg += f"1. We tried these models: {', '.join(candidate_models)}\n"
-            error_msg += f"2. We tried auto-discovering models from your key.\n"
-            error_msg += f"3. All failed. Last error: {str(last_error)}\n\n"
-            error_msg += "Please check your GEMINI_API_KEY is correct and has access to Generative Language API."
-            yield error_msg
-
-    return StreamingResponse(generate_response(), media_type="text/event-stream")
+            result = await db.execute(
+                insert(ChatSession).values(user_id=user.id, title=request.message[:30]).returning(ChatSession.id)
+            )
+            current_session_id = result.scalar_one()
+            await db.commit()
+            messages_payload = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": request.message}]
+            summary_update = None
+        metrics.chat_setup_seconds.observe(metrics.elapsed(started), "context" if request.session_id else "new_session")
+
+        # 3. Stream Response as Server-Sent Events: token, error, usage and a final
+        # done event. Generation runs in its own task (see app.llm.streams), so a client
+        # that reconnects with Last-Event-ID to /streams/{id} picks up where it left off.
+        started = time.perf_counter()
+        provider, model_name = llm_registry.resolve(request.model)
+        stream = chat_streams.create(user.id, current_session_id, detached=request.detach)
+        metrics.chat_setup_seconds.observe(metrics.elapsed(started), "resolve")
+    except BaseException:
+        # Until the generation task owns the slot, give it back on any failure
+        await chat_limiter.release(user.id)
+        raise
+
+    async def generate_response():
+        reply = []
+        finish_reason = "stop"
+        model_label = model_name or "default"
+        started = time.perf_counter()
+        first_token_at = None
+        reported = usage.capture()
+        try:
+            # Answered from the completion cache instead when it is enabled and has this context
+            async for token in completion_cache.stream(provider, model_name, messages_payload):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.chat_first_token_seconds.observe(first_token_at - started, provider.name, model_label)
+                reply.append(token)
+                stream.publish("token", {"text": token})
+        except ProviderError as e:
+            finish_reason = "error"
+            stream.publish("error", {"message": str(e)})
+        except asyncio.CancelledError:
+            # Every client went away, the job was cancelled or the server is
+            # shutting down; cancelling closes the upstream stream
+            finish_reason = "cancelled"
+            raise
+        except Exception as e:
+            finish_reason = "error"
+            stream.publish("error", {"message": f"Error streaming content from {model_name or provider.name}: {str(e)}"})
+        finally:
+            # Runs on completion, error and cancellation alike; a partial
+            # reply is kept since the user has already seen it.
+            turn = [{"role": "user", "content": request.message}]
+            if reply:
+                turn.append({"role": "assistant", "content": "".join(reply)})
+            message_writer.save_turn(current_session_id, turn, summary_update)
+            await chat_limiter.release(user.id)
+
+            # The provider's own counts when it reported them; estimates for a
+            # cached, coalesced or interrupted reply, or a provider that does not
+            estimated = "prompt_tokens" not in reported
+            if estimated:
+                prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages_payload)
+                completion_tokens = estimate_tokens("".join(reply)) if reply else 0
+            else:
+                prompt_tokens, completion_tokens = reported["prompt_tokens"], reported["completion_tokens"]
+            # Only generations the provider actually produced count towards usage
+            # and the quota: not failures, empty replies or completion cache hits
+            if reply and finish_reason != "error" and not reported.get("cached"):
+                usage_recorder.record(user.id, provider.name, model_label, prompt_tokens, completion_tokens)
+            stream.publish("usage", {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "estimated": estimated,
+            })
+            stream.publish("done", {"session_id": current_session_id, "finish_reason": finish_reason})
+            stream.finish()
+
+            finished_at = time.perf_counter()
+            metrics.chat_stream_seconds.observe(finished_at - started, provider.name, model_label, finish_reason)
+            metrics.chat_tokens.inc(provider.name, model_label, amount=completion_tokens)
+            if first_token_at is not None and len(reply) > 1 and finished_at > first_token_at:
+                metrics.chat_chunks_per_second.observe((len(reply) - 1) / (finished_at - first_token_at), provider.name, model_label)
+
+    stream.start(generate_response())
+    return _sse_response(stream)
+
+class StreamItem(BaseModel):
+    stream_id: str
+    session_id: int
+    detached: bool
+    finished: bool
+    subscribers: int
+
+@router.get("/streams", response_model=List[StreamItem])
+async def list_streams(user: User = Depends(get_current_user_readonly)):
+    # Running and recently finished replies, so another tab or a restarted client can attach
+    return [
+        {"stream_id": s.stream_id, "session_id": s.session_id, "detached": s.detached,
+         "finished": s.finished, "subscribers": s.subscribers}
+        for s in chat_streams.for_user(user.id)
+    ]
+
+@router.delete("/streams/{stream_id}")
+async def cancel_stream(stream_id: str, user: User = Depends(get_current_user)):
+    # Stops the generation; the partial reply is saved like any other
+    stream = chat_streams.get(stream_id)
+    if stream is None or stream.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    stream.cancel()
+    return {"stream_id": stream_id, "finished": stream.finished}
+
+@router.get("/streams/{stream_id}")
+async def resume_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None),
+    user: User = Depends(get_current_user_readonly)
+):
+    # Replays the events after Last-Event-ID, then follows the stream live
+    stream = chat_streams.get(stream_id)
+    if stream is None or stream.user_id != user.id:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    return _sse_response(stream, after)
+
+def _sse_response(stream: ChatStream, after: int = 0):
+    return StreamingResponse(
+        stream.subscribe(after),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no", # don't let nginx-style proxies buffer the stream
+            "X-Stream-Id": stream.stream_id,
+            "X-Session-Id": str(stream.session_id),
+        },
+    )
@@ -1,11 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
 from sqlalchemy.future import select
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
 import os
+import time
 from app.database.database import get_db
-from app.database.models import User
+from app.database.models import User, TokenUsage, SessionArchive
+from app.database.export import export_ndjson
+from app.database.usage import usage_recorder
+from app.security.user_cache import user_cache
+from app import metrics
 
 router = APIRouter()
 
@@ -14,26 +24,58 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecretkey")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+# Read-only endpoints may skip the user lookup entirely and trust the signed
+# token claims (id, email, role). A deactivated user keeps read access until the
+# token expires, so this is opt-in.
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "").lower() in ("1", "true", "yes")
+
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+class TokenUser:
+    """The caller as described by verified JWT claims, without a database row."""
+
+    def __init__(self, id: int, email: Optional[str], role: str):
+        self.id = id
+        self.email = email
+        self.role = role
+
+def decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        if payload.get("sub") is None:
             raise credentials_exception
+        return payload
     except JWTError:
         raise credentials_exception
-        
-    result = await db.execute(select(User).where(User.id == int(user_id)))
-    user = result.scalars().first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    user_id = int(decode_token(token)["sub"])
+
+    user = user_cache.get(user_id)
     if user is None:
+        started = time.perf_counter()
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
+        if user is None:
+            raise credentials_exception
+        # Detach so the cached copy is never expired or refreshed by another request's session
+        db.expunge(user)
+        user_cache.put(user)
+        metrics.auth_seconds.observe(metrics.elapsed(started), "user_lookup")
+    if not user.is_active:
         raise credentials_exception
     return user
 
+async def get_current_user_readonly(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    if TRUST_TOKEN_CLAIMS:
+        payload = decode_token(token)
+        return TokenUser(int(payload["sub"]), payload.get("email"), payload.get("role", "user"))
+    return await get_current_user(token, db)
+
 async def get_current_admin(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
@@ -43,7 +85,113 @@ async def get_current_admin(current_user: User = Depends(get_current_user)):
 async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
+@router.get("/me/export")
+async def export_me(gzip: bool = False, current_user: User = Depends(get_current_user)):
+    return _export_response(export_ndjson(current_user.id, compress=gzip), f"titanbot-export-{current_user.id}", gzip)
+
+class UsageToday(BaseModel):
+    used_today: int
+    quota: Optional[int]
+    remaining: Optional[int]
+
+@router.get("/me/usage", response_model=UsageToday)
+async def usage_me(current_user: User = Depends(get_current_user_readonly)):
+    # Today's running total (UTC day) as this worker sees it; read from the table only the first time
+    used = await usage_recorder.used_today(current_user.id)
+    quota = usage_recorder.daily_quota or None
+    if quota is None or current_user.role == "admin":
+        return {"used_today": used, "quota": None, "remaining": None}
+    return {"used_today": used, "quota": quota, "remaining": max(0, quota - used)}
+
+class UsageRow(BaseModel):
+    user_id: int
+    provider: str
+    model: str
+    requests: int
+    prompt_tokens: int
+    completion_tokens: int
+
+@router.get("/usage", response_model=List[UsageRow], dependencies=[Depends(get_current_admin)])
+async def usage_report(days: int = Query(30, ge=1, le=366), user_id: Optional[int] = None,
+                       db: AsyncSession = Depends(get_db)):
+    """Token usage per user, provider and model over the last ``days`` days."""
+    await usage_recorder.flush()
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    statement = (
+        select(TokenUsage.user_id, TokenUsage.provider, TokenUsage.model,
+               func.sum(TokenUsage.requests).label("requests"),
+               func.sum(TokenUsage.prompt_tokens).label("prompt_tokens"),
+               func.sum(TokenUsage.completion_tokens).label("completion_tokens"))
+        .where(TokenUsage.bucket_start >= since)
+        .group_by(TokenUsage.user_id, TokenUsage.provider, TokenUsage.model)
+        .order_by(TokenUsage.user_id, TokenUsage.provider, TokenUsage.model)
+    )
+    if user_id is not None:
+        statement = statement.where(TokenUsage.user_id == user_id)
+    result = await db.execute(statement)
+    return [row._asdict() for row in result.all()]
+
+class ArchiveStats(BaseModel):
+    sessions: int
+    messages: int
+    raw_bytes: int
+    stored_bytes: int
+    saved_bytes: int
+
+@router.get("/archive", response_model=ArchiveStats, dependencies=[Depends(get_current_admin)])
+async def archive_stats(db: AsyncSession = Depends(get_db)):
+    """Sessions currently archived and the space their compression saves."""
+    result = await db.execute(select(
+        func.count(func.distinct(SessionArchive.session_id)),
+        func.coalesce(func.sum(SessionArchive.message_count), 0),
+        func.coalesce(func.sum(SessionArchive.raw_bytes), 0),
+        func.coalesce(func.sum(func.length(SessionArchive.data)), 0),
+    ))
+    sessions, messages, raw_bytes, stored_bytes = result.one()
+    return {"sessions": sessions, "messages": messages, "raw_bytes": raw_bytes,
+            "stored_bytes": stored_bytes, "saved_bytes": raw_bytes - stored_bytes}
+
 @router.get("/", dependencies=[Depends(get_current_admin)])
 async def get_all_users(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User))
     return result.scalars().all()
+
+@router.get("/export", dependencies=[Depends(get_current_admin)])
+async def export_users(user_id: Optional[int] = None, gzip: bool = False):
+    """Bulk export: every user, or just ``user_id``."""
+    name = "titanbot-export-all" if user_id is None else f"titanbot-export-{user_id}"
+    return _export_response(export_ndjson(user_id, compress=gzip), name, gzip)
+
+def _export_response(body, name: str, gzip: bool):
+    # Streamed as it is read from the database; a .gz download rather than
+    # Content-Encoding, so the saved file is the compressed one
+    filename = f"{name}.ndjson.gz" if gzip else f"{name}.ndjson"
+    return StreamingResponse(
+        body,
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+    )
+
+class UserUpdateRequest(BaseModel):
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
+@router.patch("/{user_id}", dependencies=[Depends(get_current_admin)])
+async def update_user(user_id: int, request: UserUpdateRequest, db: AsyncSession = Depends(get_db)):
+    if request.role is not None and request.role not in ("user", "admin"):
+        raise HTTPException(status_code=400, detail="Role must be 'user' or 'admin'")
+
+    result = await db.execute(select(User).where(User.id == user_id))
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if request.role is not None:
+        user.role = request.role
+    if request.is_active is not None:
+        user.is_active = request.is_active
+    await db.commit()
+    await db.refresh(user)
+    # Role and active flag are checked from the cache; drop the stale copy
+    user_cache.invalidate(user_id)
+    return user
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import re
+import time
+from typing import TYPE_CHECKING, Optional
+
+from jose import JWTError, jwt
+
+if TYPE_CHECKING:
+    import httpx
+
+# Verifies Google ID tokens locally against Google's published signing keys
+# instead of calling the tokeninfo endpoint on every login. Keys are cached for
+# as long as Google's Cache-Control header allows and fetched through one
+# long-lived, pooled HTTP client. An unknown key id triggers an early refresh
+# (Google rotates keys), at most once per JWKS_MIN_REFRESH_INTERVAL.
+# httpx is imported on the first Google sign-in, keeping it off the cold-start path.
+#
+# The audience is always checked: without GOOGLE_CLIENT_ID there is no client
+# to accept tokens for, and Google sign-in is refused rather than taking tokens
+# issued to any client.
+
+DEFAULT_GOOGLE_JWKS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL") or DEFAULT_GOOGLE_JWKS_URL
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+JWKS_DEFAULT_MAX_AGE = 3600
+JWKS_MIN_REFRESH_INTERVAL = 60
+
+
+class InvalidGoogleToken(Exception):
+    pass
+
+
+class GoogleVerifierUnavailable(Exception):
+    """Tokens cannot be checked: no client id is configured, or Google's keys could not be fetched."""
+
+
+def _max_age(cache_control: Optional[str]) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE
+
+
+class GoogleTokenVerifier:
+    def __init__(self, client_id: Optional[str] = None, jwks_url: str = GOOGLE_JWKS_URL,
+                 http_client: Optional["httpx.AsyncClient"] = None):
+        self.client_id = client_id or os.getenv("GOOGLE_CLIENT_ID") or None
+        self.jwks_url = jwks_url
+        self._http = http_client
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _client(self) -> "httpx.AsyncClient":
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(timeout=5.0)
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _refresh(self, force: bool = False):
+        async with self._lock:
+            now = time.monotonic()
+            if not force and now < self._expires_at:
+                return  # another request refreshed while we waited
+            if force and now - self._fetched_at < JWKS_MIN_REFRESH_INTERVAL:
+                return
+            import httpx
+            try:
+                response = await self._client().get(self.jwks_url)
+                response.raise_for_status()
+                keys = {key["kid"]: key for key in response.json()["keys"]}
+            except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+                raise GoogleVerifierUnavailable(f"Could not fetch Google signing keys: {e}")
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + _max_age(response.headers.get("cache-control"))
+
+    async def _key(self, kid: str) -> dict:
+        if time.monotonic() >= self._expires_at:
+            await self._refresh()
+        if kid not in self._keys:
+            await self._refresh(force=True)
+        try:
+            return self._keys[kid]
+        except KeyError:
+            raise InvalidGoogleToken(f"Unknown signing key {kid}")
+
+    async def verify(self, token: str) -> dict:
+        """Check signature, issuer, audience and expiry; return the token's claims."""
+        if not self.client_id:
+            raise GoogleVerifierUnavailable("Google sign-in is not configured (GOOGLE_CLIENT_ID is not set)")
+        try:
+            header = jwt.get_unverified_header(token)
+        except JWTError as e:
+            raise InvalidGoogleToken(str(e))
+        key = await self._key(header.get("kid"))
+        try:
+            claims = jwt.decode(token, key, algorithms=["RS256"], audience=self.client_id,
+                                options={"verify_at_hash": False})
+        except JWTError as e:
+            raise InvalidGoogleToken(str(e))
+
+        if claims.get("iss") not in GOOGLE_ISSUERS:
+            raise InvalidGoogleToken("Token was not issued by Google")
+        if claims.get("email_verified") in (False, "false"):
+            raise InvalidGoogleToken("Google account email is not verified")
+        return claims
+
+
+google_verifier = GoogleTokenVerifier()
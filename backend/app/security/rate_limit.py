@@ -0,0 +1,176 @@
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Admission control for chat generations, per user:
+#   - a token bucket: CHAT_RATE_LIMIT messages per minute on average, with
+#     bursts of up to CHAT_RATE_BURST;
+#   - at most CHAT_MAX_CONCURRENT_STREAMS generations running at once.
+# admit() returns 0 when the request may go ahead (and takes a stream slot,
+# which release() gives back) or the number of seconds to wait before retrying.
+#
+# State is per process by default. Set RATE_LIMIT_BACKEND to a redis:// URL to
+# share it between workers (needs the optional redis package); if the server
+# cannot be reached, requests are let through rather than failed, like the
+# completion cache. A value of 0 disables the corresponding limit.
+
+CHAT_RATE_LIMIT = float(os.getenv("CHAT_RATE_LIMIT", 20))
+CHAT_RATE_BURST = float(os.getenv("CHAT_RATE_BURST", 10))
+CHAT_MAX_CONCURRENT_STREAMS = int(os.getenv("CHAT_MAX_CONCURRENT_STREAMS", 3))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "")
+RATE_LIMIT_MAX_TRACKED = int(os.getenv("RATE_LIMIT_MAX_TRACKED", 10000))
+
+
+class MemoryRateLimiter:
+    def __init__(self, per_minute: float = CHAT_RATE_LIMIT, burst: float = CHAT_RATE_BURST,
+                 max_streams: int = CHAT_MAX_CONCURRENT_STREAMS, max_tracked: int = RATE_LIMIT_MAX_TRACKED):
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self.max_streams = max_streams
+        self.max_tracked = max_tracked
+        self._buckets = {}  # user_id -> [tokens, updated_at]
+        self._streams = {}  # user_id -> running generations
+        self.rejected = 0
+        self.errors = 0
+
+    async def admit(self, user_id: int) -> float:
+        if self.max_streams and self._streams.get(user_id, 0) >= self.max_streams:
+            self.rejected += 1
+            return 1.0  # a slot frees up when one of the user's streams ends
+
+        if self.rate:
+            now = time.monotonic()
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                if len(self._buckets) >= self.max_tracked:
+                    self._prune(now)
+                bucket = self._buckets[user_id] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                self.rejected += 1
+                return (1 - tokens) / self.rate
+            bucket[0] = tokens - 1
+
+        self._streams[user_id] = self._streams.get(user_id, 0) + 1
+        return 0.0
+
+    async def release(self, user_id: int):
+        count = self._streams.get(user_id, 0) - 1
+        if count > 0:
+            self._streams[user_id] = count
+        else:
+            self._streams.pop(user_id, None)
+
+    def _prune(self, now: float):
+        # A bucket that has refilled is the same as no bucket at all
+        refill_time = self.burst / self.rate
+        for user_id in [uid for uid, (_, updated_at) in self._buckets.items() if now - updated_at >= refill_time]:
+            del self._buckets[user_id]
+
+    async def close(self):
+        pass
+
+
+# Refill and take one token atomically; returns the seconds to wait, 0 if admitted
+_TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = math.min(burst, (tonumber(state[1]) or burst) + (now - (tonumber(state[2]) or now)) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisRateLimiter:
+    """Same limits, with the state on a Redis-compatible server shared by all workers."""
+
+    prefix = "titanbot:ratelimit:"
+    # Stream counters expire so a worker that dies mid-stream cannot leak slots forever
+    stream_slot_ttl = 3600
+
+    def __init__(self, url: str, per_minute: float = CHAT_RATE_LIMIT, burst: float = CHAT_RATE_BURST,
+                 max_streams: int = CHAT_MAX_CONCURRENT_STREAMS):
+        self.url = url
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self.max_streams = max_streams
+        self.rejected = 0
+        self.errors = 0
+        self._client = None
+        self._bucket = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url)
+            self._bucket = self._client.register_script(_TOKEN_BUCKET_SCRIPT)
+        return self._client
+
+    async def admit(self, user_id: int) -> float:
+        try:
+            return await self._admit(user_id)
+        except Exception as e:
+            # A limiter outage must never fail the chat; admit without a slot
+            self.errors += 1
+            logger.warning("Rate limiter unavailable, admitting user %s: %s", user_id, e)
+            return 0.0
+
+    async def _admit(self, user_id: int) -> float:
+        client = self._redis()
+        streams_key = f"{self.prefix}streams:{user_id}"
+        if self.max_streams:
+            running = await client.incr(streams_key)
+            await client.expire(streams_key, self.stream_slot_ttl)
+            if running > self.max_streams:
+                await client.decr(streams_key)
+                self.rejected += 1
+                return 1.0
+
+        if self.rate:
+            wait = float(await self._bucket(keys=[f"{self.prefix}bucket:{user_id}"], args=[self.rate, self.burst, time.time()]))
+            if wait > 0:
+                if self.max_streams:
+                    await client.decr(streams_key)
+                self.rejected += 1
+                return wait
+        return 0.0
+
+    async def release(self, user_id: int):
+        if not self.max_streams:
+            return
+        streams_key = f"{self.prefix}streams:{user_id}"
+        try:
+            # Below zero when the slot was never taken (admitted during an outage)
+            if await self._redis().decr(streams_key) < 0:
+                await self._redis().delete(streams_key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Rate limiter unavailable, could not release a slot for user %s: %s", user_id, e)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def retry_after_header(wait: float) -> str:
+    return str(max(1, math.ceil(wait)))
+
+
+def create_limiter(backend: str = RATE_LIMIT_BACKEND):
+    if not backend or backend == "memory":
+        return MemoryRateLimiter()
+    if backend.startswith(("redis://", "rediss://", "unix://")):
+        return RedisRateLimiter(backend)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+chat_limiter = create_limiter()
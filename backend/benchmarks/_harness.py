@@ -0,0 +1,69 @@
+"""Shared helpers for the benchmark scripts.
+
+Boots the real FastAPI app in-process with uvicorn on a free local port and a
+throwaway SQLite database, so benchmarks exercise the same event loop, HTTP
+stack and database driver as production without touching titanbot.db.
+"""
+import asyncio
+import contextlib
+import os
+import socket
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+_tmpdir = tempfile.mkdtemp(prefix="titanbot-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["DB_AUTO_CREATE"] = "1"
+# Load generators send far more than one user's allowance; bench_rate_limit.py opts back in
+os.environ.setdefault("CHAT_RATE_LIMIT", "0")
+os.environ.setdefault("CHAT_MAX_CONCURRENT_STREAMS", "0")
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def serve_app(app=None):
+    """Run the backend (or another ASGI app) on the current event loop and yield its base URL."""
+    import uvicorn
+    if app is None:
+        from app.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def register_user(client, base_url, email=None, password="password123"):
+    """Register a fresh user and return auth headers for it."""
+    email = email or f"bench_{time.time_ns()}@example.com"
+    r = await client.post(f"{base_url}/api/auth/register", json={
+        "email": email,
+        "password": password,
+        "full_name": "Bench User"
+    })
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,100 @@
+"""Cold-session archival: space saved and the cost of reopening a session.
+
+Seeds one user with --sessions idle sessions of --per-session messages each,
+measures the database file, archives them all with SessionArchiver, VACUUMs and
+measures again. Then times GET /api/chat/sessions/{id}/messages on archived
+sessions (which rehydrates them) against the same request on sessions that are
+already back in the hot table.
+
+    python benchmarks/bench_archive.py --sessions 5000 --per-session 40
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import time
+
+from _harness import percentile, register_user, serve_app
+
+import httpx
+
+WORDS = ("the model returns a list of tokens and the client renders them as they arrive while the server "
+         "keeps the connection open and writes each chunk to the stream so latency stays low").split()
+
+
+def _seed(path, n_sessions, per_session, size):
+    rng = random.Random(0)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA synchronous=OFF")
+    db.executemany("INSERT INTO chat_sessions (id, user_id, title, updated_at) VALUES (?, 1, 'chat', '2020-01-01 00:00:00')",
+                   ((i,) for i in range(1, n_sessions + 1)))
+
+    def content():
+        return " ".join(rng.choices(WORDS, k=size // 6))[:size]
+    db.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                   ((s, "user" if i % 2 else "assistant", content())
+                    for s in range(1, n_sessions + 1) for i in range(per_session)))
+    db.commit()
+    db.close()
+
+
+def _file_mb(path):
+    db = sqlite3.connect(path)
+    db.execute("VACUUM")
+    db.close()
+    return os.path.getsize(path) / 2**20
+
+
+async def _time_reads(client, base_url, headers, session_ids):
+    samples = []
+    for session_id in session_ids:
+        started = time.perf_counter()
+        r = await client.get(f"{base_url}/api/chat/sessions/{session_id}/messages", headers=headers)
+        r.raise_for_status()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+async def main(args):
+    from app.database.archive import SessionArchiver
+    from app.database.database import DATABASE_URL
+
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=None) as client:
+        headers = await register_user(client, base_url)
+        path = DATABASE_URL.split("///", 1)[1]
+        started = time.perf_counter()
+        _seed(path, args.sessions, args.per_session, args.size)
+        print(f"seeded {args.sessions} sessions x {args.per_session} messages of ~{args.size} bytes "
+              f"in {time.perf_counter() - started:.1f}s")
+        before = _file_mb(path)
+
+        archiver = SessionArchiver(after_days=7, batch_sessions=args.batch, codec=args.codec)
+        started = time.perf_counter()
+        archived = await archiver.archive_idle()
+        elapsed = time.perf_counter() - started
+        stats = archiver.stats()
+        after = _file_mb(path)
+        print(f"archived {archived} sessions / {stats['messages_archived']} messages in {elapsed:.1f}s "
+              f"({archived / elapsed:.0f} sessions/s, codec {args.codec})")
+        print(f"packed {stats['raw_bytes'] / 2**20:.1f}MB -> {stats['stored_bytes'] / 2**20:.1f}MB "
+              f"({stats['raw_bytes'] / max(1, stats['stored_bytes']):.1f}x)")
+        print(f"database file {before:.1f}MB -> {after:.1f}MB after VACUUM")
+
+        sample = random.Random(1).sample(range(1, args.sessions + 1), min(args.reads, args.sessions))
+        cold = await _time_reads(client, base_url, headers, sample)
+        hot = await _time_reads(client, base_url, headers, sample)
+        print(f"{'get_messages':<22}{'p50':>9}{'p95':>9}")
+        for label, samples in (("archived (rehydrate)", cold), ("hot", hot)):
+            print(f"{label:<22}{percentile(samples, 50) * 1000:>7.1f}ms{percentile(samples, 95) * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--per-session", type=int, default=40)
+    parser.add_argument("--size", type=int, default=400, help="bytes of content per message")
+    parser.add_argument("--batch", type=int, default=100, help="sessions per archival transaction")
+    parser.add_argument("--codec", default="zlib", choices=("zlib", "zstd"))
+    parser.add_argument("--reads", type=int, default=200, help="sessions to reopen")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,61 @@
+"""Per-request cost of authenticating a bearer token.
+
+Times the three ways a route can resolve its caller: a SELECT on every call
+(cache disabled), the in-process user cache, and trusting token claims.
+
+    python benchmarks/bench_auth.py --iterations 5000
+"""
+import argparse
+import asyncio
+import time
+from datetime import timedelta
+
+import _harness  # noqa: F401  (points DATABASE_URL at a throwaway SQLite file)
+
+from app.database.database import Base, SessionLocal, engine
+from app.database.models import User
+from app.routes import users
+from app.routes.auth import create_access_token
+from app.security.user_cache import user_cache
+
+
+async def _time(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with SessionLocal() as db:
+        db.add(User(email="bench@example.com", full_name="Bench"))
+        await db.commit()
+    token = create_access_token({"sub": "1", "email": "bench@example.com", "role": "user"}, timedelta(minutes=5))
+
+    async with SessionLocal() as db:
+        async def uncached():
+            user_cache.clear()
+            await users.get_current_user(token, db)
+
+        async def cached():
+            await users.get_current_user(token, db)
+
+        async def claims():
+            await users.get_current_user_readonly(token, db)
+
+        results = {"db lookup": await _time(uncached, args.iterations)}
+        results["user cache"] = await _time(cached, args.iterations)
+        users.TRUST_TOKEN_CLAIMS = True
+        results["token claims"] = await _time(claims, args.iterations)
+
+    for name, micros in results.items():
+        print(f"{name:<14} {micros:>8.1f}us per request")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""Cold start of a fresh worker: import, startup, first response, memory.
+
+Each run is a new interpreter, as on a serverless cold start. Reports the
+median over --runs of: importing the app, running the startup hooks, serving
+the first GET /, and the process's peak RSS afterwards.
+
+    python benchmarks/bench_cold_start.py --runs 5 --entry app.main
+    python benchmarks/bench_cold_start.py --entry api.index --path /api/chat/sessions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+CHILD = r"""
+import json, resource, sys, time
+started = time.perf_counter()
+import importlib
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(module.app) as client:
+    booted = time.perf_counter()
+    client.get(sys.argv[2])
+    served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (booted - imported) * 1000,
+    "first_response_ms": (served - booted) * 1000,
+    "total_ms": (served - started) * 1000,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def run_once(entry, path):
+    # The repo root is on the path so the Vercel entry point (api.index) can be measured too
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/cold.db", PYTHONPATH=REPO_DIR)
+    out = subprocess.run([sys.executable, "-c", CHILD, entry, path], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(args):
+    runs = [run_once(args.entry, args.path) for _ in range(args.runs)]
+    summary = {key: round(statistics.median(r[key] for r in runs), 1) for key in runs[0]}
+    if args.json:
+        print(json.dumps(summary))
+        return
+    print(f"{args.entry} (median of {args.runs} runs)")
+    for key, value in summary.items():
+        print(f"  {key:<18} {value:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--entry", default="app.main", help="module exposing the ASGI app")
+    parser.add_argument("--path", default="/", help="first request to serve")
+    parser.add_argument("--json", action="store_true")
+    main(parser.parse_args())
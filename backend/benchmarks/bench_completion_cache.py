@@ -0,0 +1,54 @@
+"""Completion cache: reply latency with and without it on repeated prompts.
+
+Sends --requests chat messages drawn from a small pool of near-identical
+prompts ("help", "Help!", ...) through a slow fake model, once with the cache
+off and once with the in-memory backend, and reports latency and hit rate.
+
+    python benchmarks/bench_completion_cache.py --requests 60 --delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from _harness import percentile, register_user, serve_app
+
+import httpx
+
+PROMPTS = ["help", "Help!", "  help  ", "news", "News?", "advice", "Advice.", "give me some advice"]
+
+
+async def _run(client, base_url, headers, n):
+    rng = random.Random(0)
+    durations = []
+    for _ in range(n):
+        started = time.perf_counter()
+        r = await client.post(f"{base_url}/api/chat/send", json={"message": rng.choice(PROMPTS), "model": "fake"}, headers=headers)
+        r.raise_for_status()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+async def main(args):
+    os.environ["FAKE_LLM_DELAY"] = str(args.delay)
+    os.environ["FAKE_LLM_TOKENS"] = str(args.tokens)
+    from app.llm.cache import completion_cache, MemoryCacheBackend
+
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=60) as client:
+        headers = await register_user(client, base_url)
+        for name, backend in (("off", None), ("memory", MemoryCacheBackend())):
+            completion_cache.backend = backend
+            completion_cache.hits = completion_cache.misses = 0
+            durations = await _run(client, base_url, headers, args.requests)
+            stats = completion_cache.stats()
+            print(f"cache {name:<7} p50={percentile(durations, 50) * 1000:7.1f}ms "
+                  f"p95={percentile(durations, 95) * 1000:7.1f}ms hit_rate={stats['hit_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--tokens", type=int, default=30)
+    parser.add_argument("--delay", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
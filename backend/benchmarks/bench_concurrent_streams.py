@@ -0,0 +1,68 @@
+"""Open N concurrent chat streams and check the rest of the API stays responsive.
+
+Streams go to the offline fake provider (model "fake"), which sleeps between
+tokens like a real model. While the streams are running, a probe hits GET /
+in a loop and records its latency. If anything in the streaming path blocks
+the event loop, probe latency jumps to the length of a whole completion.
+
+    python benchmarks/bench_concurrent_streams.py --streams 200 --tokens 50 --delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from _harness import percentile, register_user, serve_app
+
+import httpx
+
+
+async def _stream(client, base_url, headers):
+    started = time.perf_counter()
+    first_token = None
+    async with client.stream("POST", f"{base_url}/api/chat/send", json={"message": "hello", "model": "fake"}, headers=headers) as r:
+        async for chunk in r.aiter_text():
+            if chunk and first_token is None:
+                first_token = time.perf_counter() - started
+    return first_token or 0.0, time.perf_counter() - started
+
+
+async def _probe(client, base_url, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(f"{base_url}/")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def main(args):
+    os.environ["FAKE_LLM_TOKENS"] = str(args.tokens)
+    os.environ["FAKE_LLM_DELAY"] = str(args.delay)
+    limits = httpx.Limits(max_connections=args.streams + 10)
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=None, limits=limits) as client:
+        headers = await register_user(client, base_url)
+        stop = asyncio.Event()
+        probe_samples = []
+        probe = asyncio.create_task(_probe(client, base_url, stop, probe_samples))
+        started = time.perf_counter()
+        results = await asyncio.gather(*[_stream(client, base_url, headers) for _ in range(args.streams)])
+        wall = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    ttft = [r[0] for r in results]
+    durations = [r[1] for r in results]
+    ideal = args.tokens * args.delay
+    print(f"streams={args.streams} tokens/stream={args.tokens} ideal stream time={ideal:.2f}s wall={wall:.2f}s")
+    print(f"stream duration  p50={percentile(durations, 50):.3f}s p99={percentile(durations, 99):.3f}s")
+    print(f"time-to-first    p50={percentile(ttft, 50):.3f}s p99={percentile(ttft, 99):.3f}s")
+    print(f"GET / while busy n={len(probe_samples)} p50={percentile(probe_samples, 50) * 1000:.1f}ms "
+          f"p99={percentile(probe_samples, 99) * 1000:.1f}ms max={max(probe_samples, default=0) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.02, help="seconds between fake tokens")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""Prompt-building latency as a conversation grows.
+
+Seeds sessions of increasing length and times build_context() against the
+old approach (fetch the whole history, concatenate it into one string).
+build_context() should stay flat; the naive path grows with the session.
+
+    python benchmarks/bench_context_builder.py --sizes 10 100 1000 5000
+"""
+import argparse
+import asyncio
+import time
+
+import _harness  # noqa: F401  (points DATABASE_URL at a throwaway SQLite file)
+
+from sqlalchemy import insert, update
+from sqlalchemy.future import select
+
+from app.database.database import Base, SessionLocal, engine
+from app.database.models import ChatSession, Message, User
+from app.llm.context import build_context
+
+SYSTEM_PROMPT = "You are TitanBot."
+
+
+async def _seed(db, user_id, size):
+    session = ChatSession(user_id=user_id, title=f"{size} messages")
+    db.add(session)
+    await db.flush()
+    session_id = session.id
+    rows = [
+        {"session_id": session_id, "role": "user" if i % 2 == 0 else "assistant",
+         "content": f"message {i} " + "lorem ipsum dolor sit amet " * 8}
+        for i in range(size)
+    ]
+    await db.execute(insert(Message), rows)
+    await db.commit()
+    return session_id
+
+
+async def _naive(db, session_id):
+    rows = (await db.execute(
+        select(Message.role, Message.content).where(Message.session_id == session_id).order_by(Message.created_at.asc())
+    )).all()
+    prompt = f"{SYSTEM_PROMPT}\n\n"
+    for row in rows:
+        prompt += f"{row.role.upper()}: {row.content}\n"
+    return prompt
+
+
+async def _time(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with SessionLocal() as db:
+        user = User(email="bench@example.com", full_name="Bench")
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        user_id = user.id
+        session_ids = {size: await _seed(db, user_id, size) for size in args.sizes}
+
+    print(f"{'messages':>10} {'build_context':>15} {'naive':>12}")
+    for size, session_id in session_ids.items():
+        async with SessionLocal() as db:
+            async def builder():
+                return await build_context(db, session_id, user_id, SYSTEM_PROMPT, "next question")
+
+            # First call folds the backlog into the summary; measure steady state.
+            _, summary_update = await builder()
+            if summary_update:
+                await db.execute(update(ChatSession).where(ChatSession.id == session_id).values(**summary_update))
+                await db.commit()
+            built = await _time(builder, args.repeat)
+            naive = await _time(lambda: _naive(db, session_id), args.repeat)
+        print(f"{size:>10} {built:>13.2f}ms {naive:>10.2f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
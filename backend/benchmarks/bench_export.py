@@ -0,0 +1,99 @@
+"""Streaming NDJSON export: memory and throughput on one large user.
+
+Seeds one user with --messages messages of --size bytes each, downloads
+GET /api/users/me/export (plain and gzipped) while sampling the process's
+resident memory, then loads the same history the way the listing endpoints
+would, as ORM objects, for comparison. Server and client share the process, so
+the RSS figures are an upper bound for the server.
+
+    python benchmarks/bench_export.py --messages 500000 --size 500
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+
+from _harness import register_user, serve_app
+
+import httpx
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+async def _sample_peak(stop, peak):
+    while not stop.is_set():
+        peak[0] = max(peak[0], _rss_mb())
+        await asyncio.sleep(0.02)
+
+
+async def _measured(label, work):
+    stop, peak = asyncio.Event(), [_rss_mb()]
+    before = peak[0]
+    sampler = asyncio.create_task(_sample_peak(stop, peak))
+    started = time.perf_counter()
+    size = await work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    print(f"{label:<22} {size / 2**20:>8.1f}MB in {elapsed:>6.2f}s ({size / 2**20 / elapsed:>6.1f}MB/s) "
+          f"peak RSS +{peak[0] - before:.0f}MB")
+
+
+def _seed(path, n_messages, size, n_sessions):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA synchronous=OFF")
+    db.executemany("INSERT INTO chat_sessions (id, user_id, title) VALUES (?, 1, 'chat')",
+                   ((i,) for i in range(1, n_sessions + 1)))
+    content = ("lorem ipsum dolor sit amet " * (size // 27 + 1))[:size]
+    db.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                   ((i % n_sessions + 1, "user" if i % 2 else "assistant", content) for i in range(n_messages)))
+    db.commit()
+    db.close()
+
+
+async def main(args):
+    from app.database.database import DATABASE_URL, SessionLocal
+    from app.database.models import ChatSession
+
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=None) as client:
+        headers = await register_user(client, base_url)
+        started = time.perf_counter()
+        # The search triggers are not what is being measured; seed without them
+        path = DATABASE_URL.split("///", 1)[1]
+        db = sqlite3.connect(path)
+        db.executescript("DROP TRIGGER IF EXISTS messages_fts_insert;")
+        db.close()
+        _seed(path, args.messages, args.size, args.sessions)
+        print(f"seeded {args.messages} messages of {args.size} bytes in {time.perf_counter() - started:.1f}s")
+
+        for label, params in (("export", {}), ("export (gzip)", {"gzip": True})):
+            async def download():
+                total = 0
+                async with client.stream("GET", f"{base_url}/api/users/me/export", params=params, headers=headers) as r:
+                    r.raise_for_status()
+                    async for chunk in r.aiter_raw():
+                        total += len(chunk)
+                return total
+            await _measured(label, download)
+
+        async def load_orm():
+            async with SessionLocal() as session:
+                result = await session.execute(
+                    select(ChatSession).where(ChatSession.user_id == 1).options(selectinload(ChatSession.messages)))
+                sessions = result.scalars().all()
+                return sum(len(m.content) for s in sessions for m in s.messages)
+        await _measured("ORM load (no export)", load_orm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500_000)
+    parser.add_argument("--size", type=int, default=500, help="bytes of content per message")
+    parser.add_argument("--sessions", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
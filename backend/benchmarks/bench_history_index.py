@@ -0,0 +1,91 @@
+"""History and session-list queries over a large seeded SQLite database.
+
+Seeds --messages rows spread over --sessions sessions, prints SQLite's query
+plan for the hot queries, and times them with the composite indexes in place
+and again after dropping them.
+
+    python benchmarks/bench_history_index.py --messages 1000000 --sessions 10000
+"""
+import argparse
+import asyncio
+import random
+import sqlite3
+import time
+
+import _harness  # noqa: F401  (points DATABASE_URL at a throwaway SQLite file)
+
+from sqlalchemy import text
+
+from app.database.database import Base, engine
+from app.database import models  # noqa: F401
+
+QUERIES = {
+    "get_messages": "SELECT id, role, content, created_at FROM messages WHERE session_id = :sid ORDER BY created_at, id",
+    "context window": "SELECT id, role, content FROM messages WHERE session_id = :sid ORDER BY id DESC LIMIT 50",
+    "get_sessions": "SELECT id, title, updated_at FROM chat_sessions WHERE user_id = :uid ORDER BY updated_at DESC, id DESC LIMIT 50",
+}
+COMPOSITE_INDEXES = ["ix_messages_session_id_created_at", "ix_messages_session_id_id", "ix_chat_sessions_user_id_updated_at"]
+
+
+def _seed(path, n_messages, n_sessions, n_users):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")
+    db.executemany("INSERT INTO users (id, email, role, is_active) VALUES (?, ?, 'user', 1)",
+                   ((i, f"user{i}@example.com") for i in range(1, n_users + 1)))
+    db.executemany(
+        "INSERT INTO chat_sessions (id, user_id, title, created_at, updated_at) VALUES (?, ?, 'chat', datetime('now'), datetime('now', ?))",
+        ((i, random.randint(1, n_users), f"-{random.randint(0, 10**6)} seconds") for i in range(1, n_sessions + 1)))
+    rng = random.Random(0)
+    db.executemany(
+        "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, datetime('now', ?))",
+        ((rng.randint(1, n_sessions), "user" if i % 2 else "assistant", "lorem ipsum dolor sit amet " * 4, f"+{i} seconds")
+         for i in range(n_messages)))
+    db.commit()
+    db.execute("ANALYZE")
+    return db
+
+
+def _report(db, label, repeat):
+    print(f"\n{label}")
+    for name, sql in QUERIES.items():
+        params = {"sid": 42, "uid": 7}
+        plan = " | ".join(row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.execute(sql, params).fetchall()
+        ms = (time.perf_counter() - started) / repeat * 1000
+        print(f"  {name:<15} {ms:>8.3f}ms  plan: {plan}")
+
+
+async def _create_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        path = (await conn.execute(text("PRAGMA database_list"))).fetchone()[2]
+    await engine.dispose()
+    return path
+
+
+def main(args):
+    path = asyncio.run(_create_schema())
+    started = time.perf_counter()
+    db = _seed(path, args.messages, args.sessions, args.users)
+    print(f"seeded {args.messages} messages / {args.sessions} sessions in {time.perf_counter() - started:.1f}s")
+
+    _report(db, "with composite indexes", args.repeat)
+    for name in COMPOSITE_INDEXES:
+        db.execute(f"DROP INDEX {name}")
+    db.commit()
+    db.close()
+    # Fresh connection so no statement prepared against the old schema is reused
+    db = sqlite3.connect(path)
+    _report(db, "without composite indexes", max(1, args.repeat // 10))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=100)
+    main(parser.parse_args())
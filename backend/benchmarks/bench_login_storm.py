@@ -0,0 +1,87 @@
+"""Chat latency during a burst of logins.
+
+Runs the same set of streaming chats twice, once alone and once while a storm
+of concurrent logins hits /api/auth/login, and compares the largest gap
+between tokens plus GET / latency. With bcrypt off the event loop both
+should stay flat; logins that overflow the hashing queue get a 503.
+
+    python benchmarks/bench_login_storm.py --streams 20 --logins 100
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from _harness import percentile, register_user, serve_app
+
+import httpx
+
+PASSWORD = "password123"
+
+
+async def _stream(client, base_url, headers):
+    gaps = []
+    last = time.perf_counter()
+    async with client.stream("POST", f"{base_url}/api/chat/send", json={"message": "hi", "model": "fake"}, headers=headers) as r:
+        async for _ in r.aiter_text():
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+    return max(gaps[1:], default=0.0)
+
+
+async def _probe(client, base_url, stop, samples):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(f"{base_url}/")
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.01)
+
+
+async def _login(client, base_url, email):
+    started = time.perf_counter()
+    r = await client.post(f"{base_url}/api/auth/login", json={"email": email, "password": PASSWORD})
+    return r.status_code, time.perf_counter() - started
+
+
+async def _round(client, base_url, headers, args, email=None):
+    stop = asyncio.Event()
+    probes = []
+    probe = asyncio.create_task(_probe(client, base_url, stop, probes))
+    streams = [_stream(client, base_url, headers) for _ in range(args.streams)]
+    logins = [_login(client, base_url, email) for _ in range(args.logins)] if email else []
+    results = await asyncio.gather(*streams, *logins)
+    stop.set()
+    await probe
+    return results[:args.streams], results[args.streams:], probes
+
+
+async def main(args):
+    os.environ["FAKE_LLM_TOKENS"] = str(args.tokens)
+    os.environ["FAKE_LLM_DELAY"] = str(args.delay)
+    limits = httpx.Limits(max_connections=args.streams + args.logins + 10)
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=None, limits=limits) as client:
+        from app.security.passwords import password_hasher
+
+        email = f"storm_{time.time_ns()}@example.com"
+        headers = await register_user(client, base_url, email=email, password=PASSWORD)
+
+        for label, login_email in (("chats only", None), ("chats + login storm", email)):
+            gaps, logins, probes = await _round(client, base_url, headers, args, login_email)
+            print(f"{label}:")
+            print(f"  max token gap  p50={percentile(gaps, 50) * 1000:.1f}ms p99={percentile(gaps, 99) * 1000:.1f}ms")
+            print(f"  GET /          p50={percentile(probes, 50) * 1000:.1f}ms p99={percentile(probes, 99) * 1000:.1f}ms")
+            if logins:
+                ok = [t for status, t in logins if status == 200]
+                print(f"  logins         ok={len(ok)} rejected={sum(1 for s, _ in logins if s == 503)} "
+                      f"p50={percentile(ok, 50) * 1000:.0f}ms p99={percentile(ok, 99) * 1000:.0f}ms")
+        print(f"hasher stats: {password_hasher.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--streams", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""Ollama scheduling: direct requests vs. the queueing, coalescing scheduler.
+
+Starts benchmarks/fake_ollama.py in-process and fires --requests concurrent
+chats drawn from --distinct prompts, first straight at the daemon and then
+through OllamaProvider's InferenceScheduler. Reports how many generations the
+daemon ran, its peak concurrency, end-to-end latency and the scheduler's queue
+statistics.
+
+    python benchmarks/bench_ollama_scheduler.py --requests 40 --distinct 5
+"""
+import argparse
+import asyncio
+import time
+
+from _harness import percentile, serve_app
+from fake_ollama import FakeOllama
+
+from app.llm.providers import OllamaProvider
+
+
+async def _fire(stream, n, distinct):
+    async def one(i):
+        started = time.perf_counter()
+        first = None
+        async for _ in stream("llama3.2", [{"role": "user", "content": f"question {i % distinct}"}]):
+            if first is None:
+                first = time.perf_counter() - started
+        return first, time.perf_counter() - started
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(n)))
+    return results, time.perf_counter() - started
+
+
+async def main(args):
+    for mode in ("direct", "scheduled"):
+        fake = FakeOllama(args.tokens, args.delay, args.daemon_parallel)
+        async with serve_app(fake.app) as base_url:
+            provider = OllamaProvider(host=base_url)
+            provider.scheduler.max_parallel = args.parallel
+            await provider.startup()
+            stream = provider._generate if mode == "direct" else provider.stream
+            results, wall = await _fire(stream, args.requests, args.distinct)
+            await provider.shutdown()
+
+        ttft = [r[0] for r in results]
+        total = [r[1] for r in results]
+        print(f"{mode:<10} generations={fake.generations:<3} daemon_peak={fake.max_active} wall={wall:.2f}s "
+              f"ttft p50={percentile(ttft, 50):.3f}s p95={percentile(ttft, 95):.3f}s "
+              f"total p50={percentile(total, 50):.3f}s p95={percentile(total, 95):.3f}s")
+        if mode == "scheduled":
+            stats = provider.scheduler.stats()
+            print(f"{'':<10} coalesced={stats['coalesced']} avg_wait={stats['avg_wait_seconds']:.3f}s "
+                  f"max_wait={stats['max_wait_seconds']:.3f}s keep_alive={sorted(fake.keep_alive)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=5)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--parallel", type=int, default=1, help="scheduler parallelism limit")
+    parser.add_argument("--daemon-parallel", type=int, default=1, help="generations the fake daemon runs at once")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""Overhead of chat admission control, and its 429s over HTTP.
+
+Times MemoryRateLimiter.admit() + release() in a tight loop across many users
+(the target is well under 50µs per request), then checks that the running app
+answers a burst from one user with 429 and a Retry-After header.
+
+    python benchmarks/bench_rate_limit.py --calls 200000 --users 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+os.environ["CHAT_RATE_LIMIT"] = "60"
+os.environ["CHAT_RATE_BURST"] = "5"
+os.environ["CHAT_MAX_CONCURRENT_STREAMS"] = "2"
+
+from _harness import register_user, serve_app
+
+import httpx
+
+from app.security.rate_limit import MemoryRateLimiter
+
+BUDGET_US = 50
+
+
+async def _overhead(calls, users):
+    # Generous limits so every call takes the full admit path
+    limiter = MemoryRateLimiter(per_minute=10**9, burst=10**9, max_streams=10**9)
+    started = time.perf_counter()
+    for i in range(calls):
+        user_id = i % users
+        await limiter.admit(user_id)
+        await limiter.release(user_id)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+async def _burst(n):
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=30) as client:
+        headers = await register_user(client, base_url)
+        statuses = []
+        for _ in range(n):
+            r = await client.post(f"{base_url}/api/chat/send", json={"message": "hi", "model": "fake"}, headers=headers)
+            statuses.append((r.status_code, r.headers.get("retry-after")))
+        return statuses
+
+
+async def main(args):
+    per_call = await _overhead(args.calls, args.users)
+    print(f"admit+release: {per_call:.2f}µs per request ({args.calls} calls, {args.users} users), budget {BUDGET_US}µs")
+
+    statuses = await _burst(args.burst)
+    admitted = sum(1 for status, _ in statuses if status == 200)
+    limited = [retry for status, retry in statuses if status == 429]
+    print(f"burst of {args.burst}: {admitted} admitted, {len(limited)} rejected with 429 (Retry-After {limited[:1]})")
+
+    if per_call > BUDGET_US or not limited:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--burst", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
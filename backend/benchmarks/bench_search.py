@@ -0,0 +1,138 @@
+"""Full-text message search over a large seeded SQLite database.
+
+Seeds --messages rows of random text (Zipf-distributed vocabulary, so some
+words are in most messages and others in very few) across --users users,
+through the real schema and its FTS5 triggers. Then times search_messages(),
+the query behind GET /api/chat/search, for common, rare, multi-word and prefix
+queries, against the LIKE '%q%' scan it replaces.
+
+    python benchmarks/bench_search.py --messages 2000000 --users 2000
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import sqlite3
+import time
+
+import _harness  # noqa: F401  (points DATABASE_URL at a throwaway SQLite file)
+from _harness import percentile
+
+from sqlalchemy import text
+
+from app.database.database import Base, SessionLocal, engine
+from app.database import models  # noqa: F401
+from app.database.search import search_messages
+
+VOCABULARY = 20_000
+WORDS_PER_MESSAGE = 30
+
+
+def _words():
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(VOCABULARY)]
+
+
+def _seed(path, words, n_messages, n_sessions, n_users):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")
+    db.executemany("INSERT INTO users (id, email, role, is_active) VALUES (?, ?, 'user', 1)",
+                   ((i, f"user{i}@example.com") for i in range(1, n_users + 1)))
+    db.executemany("INSERT INTO chat_sessions (id, user_id, title) VALUES (?, ?, 'chat')",
+                   ((i, (i - 1) % n_users + 1) for i in range(1, n_sessions + 1)))
+    rng = random.Random(0)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, VOCABULARY + 1)))
+    batch = 50_000
+    for start in range(0, n_messages, batch):
+        rows = []
+        for i in range(start, min(start + batch, n_messages)):
+            content = " ".join(rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_MESSAGE))
+            rows.append((rng.randint(1, n_sessions), "user" if i % 2 else "assistant", content))
+        db.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", rows)
+    db.commit()
+    db.execute("INSERT INTO messages_fts(messages_fts) VALUES ('optimize')")
+    db.execute("ANALYZE")
+    db.commit()
+    return db
+
+
+async def _time_search(queries, n_users, repeat):
+    rng = random.Random(2)
+    results = {}
+    async with SessionLocal() as db:
+        for name, query in queries.items():
+            samples, hits = [], 0
+            for _ in range(repeat):
+                user_id = rng.randint(1, n_users)
+                started = time.perf_counter()
+                rows, _ = await search_messages(db, user_id, query, limit=20)
+                samples.append(time.perf_counter() - started)
+                hits += len(rows)
+            results[name] = (samples, hits / repeat)
+    return results
+
+
+def _time_like(db, queries, n_users, repeat):
+    rng = random.Random(2)
+    results = {}
+    # Every match is needed to rank them, so no LIMIT
+    sql = ("SELECT m.id, m.content FROM messages m JOIN chat_sessions s ON s.id = m.session_id "
+           "WHERE s.user_id = ? AND m.content LIKE ?")
+    for name, query in queries.items():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            db.execute(sql, (rng.randint(1, n_users), f"%{query.rstrip('*')}%")).fetchall()
+            samples.append(time.perf_counter() - started)
+        results[name] = samples
+    return results
+
+
+async def _create_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        path = (await conn.execute(text("PRAGMA database_list"))).fetchone()[2]
+    return path
+
+
+def main(args):
+    path = asyncio.run(_create_schema())
+    words = _words()
+    started = time.perf_counter()
+    db = _seed(path, words, args.messages, args.sessions, args.users)
+    print(f"seeded {args.messages} messages / {args.sessions} sessions / {args.users} users "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    queries = {
+        "common word": words[0],
+        "mid word": words[200],
+        "rare word": words[15_000],
+        "two words": f"{words[3]} {words[40]}",
+        "prefix": words[10][:3] + "*",
+    }
+
+    async def run():
+        try:
+            return await _time_search(queries, args.users, args.repeat)
+        finally:
+            await engine.dispose()
+
+    fts = asyncio.run(run())
+    like = _time_like(db, {name: q for name, q in queries.items() if name != "two words"}, args.users,
+                      max(1, args.repeat // 20))
+    print(f"{'query':<13}{'hits':>6}{'fts p50':>11}{'fts p95':>11}{'like p50':>11}")
+    for name, (samples, hits) in fts.items():
+        like_p50 = f"{percentile(like[name], 50) * 1000:.1f}ms" if name in like else "-"
+        print(f"{name:<13}{hits:>6.1f}{percentile(samples, 50) * 1000:>9.1f}ms{percentile(samples, 95) * 1000:>9.1f}ms"
+              f"{like_p50:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,104 @@
+"""Session listing: full ORM list vs. one keyset page.
+
+Seeds a user with --sessions chat sessions and compares the old listing
+(every session as an ORM object, serialised with jsonable_encoder) with the
+paginated endpoint's first page and with walking every page via next_cursor.
+Reports mean latency and peak Python allocation per call.
+
+    python benchmarks/bench_session_listing.py --sessions 10000 --limit 50
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+import _harness  # noqa: F401  (points DATABASE_URL at a throwaway SQLite file)
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert, text
+from sqlalchemy.future import select
+
+from app.database.database import Base, SessionLocal, engine
+from app.database.models import ChatSession, User
+from app.routes.chat import get_sessions
+from app.routes.users import TokenUser
+
+
+async def _seed(n_sessions):
+    async with SessionLocal() as db:
+        user = User(email="bench@example.com", full_name="Bench")
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+        user = TokenUser(user.id, user.email, user.role)
+        rows = [{"user_id": user.id, "title": f"chat {i}"} for i in range(n_sessions)]
+        await db.execute(insert(ChatSession), rows)
+        # Spread updated_at out so the ordering is realistic
+        await db.execute(text("UPDATE chat_sessions SET updated_at = datetime('now', '-' || (id * 37 % 100000) || ' seconds')"))
+        await db.commit()
+        return user
+
+
+async def _full_orm(db, user):
+    result = await db.execute(select(ChatSession).where(ChatSession.user_id == user.id).order_by(ChatSession.updated_at.desc()))
+    return jsonable_encoder(result.scalars().all())
+
+
+async def _first_page(db, user, limit):
+    return await get_sessions(cursor=None, limit=limit, since=None, user=user, db=db)
+
+
+async def _all_pages(db, user, limit):
+    cursor, total = None, 0
+    while True:
+        page = await get_sessions(cursor=cursor, limit=limit, since=None, user=user, db=db)
+        total += len(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return total
+
+
+async def _measure(fn, repeat):
+    # Fresh session per call so the identity map does not carry objects over
+    async def once():
+        async with SessionLocal() as db:
+            return await fn(db)
+
+    await once()  # warm up the statement cache
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await once()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+
+    tracemalloc.start()
+    await once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+async def main(args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    user = await _seed(args.sessions)
+
+    cases = {
+        "full ORM list": lambda db: _full_orm(db, user),
+        f"first page ({args.limit})": lambda db: _first_page(db, user, args.limit),
+        "all pages": lambda db: _all_pages(db, user, args.limit),
+    }
+    print(f"{args.sessions} sessions")
+    print(f"{'case':<20} {'latency':>12} {'peak alloc':>12}")
+    for name, fn in cases.items():
+        latency, peak_kib = await _measure(fn, args.repeat)
+        print(f"{name:<20} {latency:>10.2f}ms {peak_kib:>9.0f}KiB")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
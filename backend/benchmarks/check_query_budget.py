@@ -0,0 +1,61 @@
+"""Fail if the chat hot path runs more SQL statements than budgeted.
+
+Boots the app with DEBUG=1 so every response carries an X-DB-Queries header,
+then drives /api/chat/send for a new session, an existing one and a long one
+(so the history no longer fits the context window). Exits non-zero when any
+request goes over its budget, so it can gate CI.
+
+    python benchmarks/check_query_budget.py
+"""
+import asyncio
+import os
+import sys
+
+from _harness import register_user, serve_app
+
+import httpx
+
+# Statements before the first streamed byte, with the caller already in the user cache.
+BUDGETS = {
+    "send (new session)": 1,
+    "send (existing session)": 1,
+    "send (long session)": 2,
+}
+
+
+async def _send(client, base_url, headers, session_id=None):
+    payload = {"message": "hello " * 200, "model": "fake", "session_id": session_id}
+    async with client.stream("POST", f"{base_url}/api/chat/send", json=payload, headers=headers) as r:
+        r.raise_for_status()
+        count = int(r.headers["X-DB-Queries"])
+        await r.aread()
+    return count
+
+
+async def main():
+    os.environ["DEBUG"] = "1"
+    async with serve_app() as base_url, httpx.AsyncClient(timeout=30) as client:
+        headers = await register_user(client, base_url)
+        await client.get(f"{base_url}/api/users/me", headers=headers)  # warm the user cache
+        counts = {"send (new session)": await _send(client, base_url, headers)}
+
+        sessions = (await client.get(f"{base_url}/api/chat/sessions", headers=headers)).json()["items"]
+        session_id = sessions[0]["id"]
+        await asyncio.sleep(0.2)  # let the write-behind queue flush
+        counts["send (existing session)"] = await _send(client, base_url, headers, session_id)
+
+        for _ in range(30):
+            await _send(client, base_url, headers, session_id)
+        await asyncio.sleep(0.2)
+        counts["send (long session)"] = await _send(client, base_url, headers, session_id)
+
+    failed = False
+    for name, budget in BUDGETS.items():
+        status = "ok" if counts[name] <= budget else "OVER BUDGET"
+        failed |= counts[name] > budget
+        print(f"{name:<26} {counts[name]:>3} queries (budget {budget}) {status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
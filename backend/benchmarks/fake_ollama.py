@@ -0,0 +1,69 @@
+"""A stand-in for a local Ollama daemon, for tests and benchmarks.
+
+Serves POST /api/chat with Ollama's streaming NDJSON format. Like the real
+daemon it runs at most --parallel generations at once (the rest wait), and it
+records how many generations it ran and the highest concurrency it saw. Every
+reply is --tokens chunks, --delay seconds apart.
+
+    python benchmarks/fake_ollama.py --port 11434 --delay 0.02
+    OLLAMA_HOST=http://127.0.0.1:11434 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+
+class FakeOllama:
+    def __init__(self, tokens=20, delay=0.01, parallel=1):
+        self.tokens = tokens
+        self.delay = delay
+        self.slots = asyncio.Semaphore(parallel)
+        self.generations = 0
+        self.loads = 0
+        self.active = 0
+        self.max_active = 0
+        self.keep_alive = set()
+        self.app = Starlette(routes=[Route("/api/chat", self.chat, methods=["POST"])])
+
+    async def chat(self, request):
+        body = await request.json()
+        model = body["model"]
+        if body.get("keep_alive") is not None:
+            self.keep_alive.add(str(body["keep_alive"]))
+        if not body.get("messages"):
+            self.loads += 1
+            return JSONResponse({"model": model, "message": {"role": "assistant", "content": ""}, "done": True})
+        prompt = body["messages"][-1]["content"]
+
+        async def generate():
+            async with self.slots:
+                self.generations += 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    for i in range(self.tokens):
+                        await asyncio.sleep(self.delay)
+                        text = f"{prompt} " if i == 0 else f"token{i} "
+                        yield json.dumps({"model": model, "message": {"role": "assistant", "content": text}, "done": False}) + "\n"
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                                      "prompt_eval_count": len(prompt.split()), "eval_count": self.tokens}) + "\n"
+                finally:
+                    self.active -= 1
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--parallel", type=int, default=1)
+    args = parser.parse_args()
+    uvicorn.run(FakeOllama(args.tokens, args.delay, args.parallel).app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,235 @@
+"""End-to-end load test: concurrent users register, log in, open a session and chat.
+
+Boots the app in-process against a throwaway SQLite database (see _harness.py)
+with DEBUG=1, so every response reports its SQL statements in X-DB-Queries, and
+chats with the offline fake provider. Each of --users virtual users runs
+register -> login -> create session -> --messages streamed sends, all users at
+once. Reports p50/p95/p99 latency per step, time to first token, throughput and
+queries per request.
+
+    python benchmarks/load_test.py --users 50 --messages 5 --json results.json
+    python benchmarks/load_test.py --baseline results.json   # exit 1 on a regression
+
+--base-url points it at a running server instead (query counts are only
+reported if that server runs with DEBUG=1).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from _harness import percentile, serve_app
+
+import httpx
+
+STEPS = ("register", "login", "create_session", "send")
+
+
+class Results:
+    def __init__(self):
+        self.latency = {step: [] for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+        self.errors = {step: 0 for step in STEPS}
+        self.first_token = []
+        self.tokens = 0
+
+    def record(self, step, started, response=None):
+        self.latency[step].append(time.perf_counter() - started)
+        if response is not None and "X-DB-Queries" in response.headers:
+            self.queries[step].append(int(response.headers["X-DB-Queries"]))
+
+
+async def _timed(results, step, request):
+    started = time.perf_counter()
+    try:
+        r = await request
+        r.raise_for_status()
+    except httpx.HTTPError:
+        results.errors[step] += 1
+        return None
+    results.record(step, started, r)
+    return r
+
+
+async def _send(client, base_url, headers, session_id, message, model, results):
+    """Stream one reply, reading the Server-Sent Events as they arrive."""
+    started = time.perf_counter()
+    first_token = None
+    event = None
+    try:
+        async with client.stream("POST", f"{base_url}/api/chat/send", headers=headers,
+                                 json={"message": message, "model": model, "session_id": session_id}) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:") and event == "token":
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    results.tokens += 1
+                elif line.startswith("data:") and event == "error":
+                    raise httpx.HTTPError(json.loads(line[5:])["message"])
+    except httpx.HTTPError:
+        results.errors["send"] += 1
+        return
+    results.record("send", started, r)
+    if first_token is not None:
+        results.first_token.append(first_token)
+
+
+async def _user(client, base_url, n, args, results):
+    email = f"load_{time.time_ns()}_{n}@example.com"
+    password = "password123"
+    r = await _timed(results, "register", client.post(
+        f"{base_url}/api/auth/register", json={"email": email, "password": password, "full_name": f"Load User {n}"}))
+    if r is None:
+        return
+    r = await _timed(results, "login", client.post(
+        f"{base_url}/api/auth/login", json={"email": email, "password": password}))
+    if r is None:
+        return
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+    r = await _timed(results, "create_session", client.post(
+        f"{base_url}/api/chat/sessions", json={"title": "Load test"}, headers=headers))
+    if r is None:
+        return
+    session_id = r.json()["id"]
+    for i in range(args.messages):
+        await _send(client, base_url, headers, session_id, f"message {i} from user {n}", args.model, results)
+
+
+def _summary(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values, default=0.0),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _report(args, results, wall):
+    steps = {}
+    for step in STEPS:
+        steps[step] = _summary(results.latency[step])
+        steps[step]["errors"] = results.errors[step]
+        queries = results.queries[step]
+        steps[step]["queries_per_request"] = sum(queries) / len(queries) if queries else None
+    sends = len(results.latency["send"])
+    requests = sum(len(values) for values in results.latency.values())
+    return {
+        "commit": _commit(),
+        "config": {"users": args.users, "messages": args.messages, "tokens": args.tokens,
+                   "delay": args.delay, "model": args.model, "base_url": args.base_url},
+        "wall_seconds": wall,
+        "steps": steps,
+        "time_to_first_token": _summary(results.first_token),
+        "throughput": {
+            "requests_per_second": requests / wall,
+            "messages_per_second": sends / wall,
+            "tokens_per_second": results.tokens / wall,
+        },
+    }
+
+
+def _print(report):
+    print(f"commit={report['commit']} wall={report['wall_seconds']:.2f}s "
+          + " ".join(f"{key}={value}" for key, value in report["config"].items() if value is not None))
+    print(f"{'step':<21}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    rows = dict(report["steps"], time_to_first_token=dict(report["time_to_first_token"], errors=0))
+    for name, row in rows.items():
+        queries = row.get("queries_per_request")
+        print(f"{name:<21}{row['count']:>6}{row['errors']:>5}{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}"
+              f"{row['p99'] * 1000:>10.1f}{'' if queries is None else f'{queries:.2f}':>9}")
+    throughput = report["throughput"]
+    print(f"throughput: {throughput['requests_per_second']:.1f} req/s, "
+          f"{throughput['messages_per_second']:.1f} messages/s, {throughput['tokens_per_second']:.0f} tokens/s")
+
+
+def _regressions(report, baseline, tolerance):
+    """Latency p95s more than ``tolerance`` slower, and any rise in queries per request."""
+    found = []
+    current = dict(report["steps"], time_to_first_token=report["time_to_first_token"])
+    previous = dict(baseline["steps"], time_to_first_token=baseline["time_to_first_token"])
+    for name, row in current.items():
+        before = previous.get(name)
+        if not before or not row["count"]:
+            continue
+        if before["p95"] and row["p95"] > before["p95"] * (1 + tolerance):
+            found.append(f"{name} p95 {before['p95'] * 1000:.1f}ms -> {row['p95'] * 1000:.1f}ms")
+        if before.get("queries_per_request") is not None and row.get("queries_per_request") is not None \
+                and row["queries_per_request"] > before["queries_per_request"]:
+            found.append(f"{name} queries {before['queries_per_request']:.2f} -> {row['queries_per_request']:.2f}")
+        if row.get("errors"):
+            found.append(f"{name} {row['errors']} errors")
+    return found
+
+
+async def run(args):
+    os.environ["DEBUG"] = "1"
+    os.environ["FAKE_LLM_TOKENS"] = str(args.tokens)
+    os.environ["FAKE_LLM_DELAY"] = str(args.delay)
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+
+    results = Results()
+    limits = httpx.Limits(max_connections=args.users + 10)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        if args.base_url:
+            base_url = args.base_url.rstrip("/")
+            started = time.perf_counter()
+            await asyncio.gather(*(_user(client, base_url, n, args, results) for n in range(args.users)))
+            wall = time.perf_counter() - started
+        else:
+            async with serve_app() as base_url:
+                started = time.perf_counter()
+                await asyncio.gather(*(_user(client, base_url, n, args, results) for n in range(args.users)))
+                wall = time.perf_counter() - started
+    return _report(args, results, wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=5, help="messages each user sends")
+    parser.add_argument("--tokens", type=int, default=50, help="tokens in each fake reply")
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds between fake tokens")
+    parser.add_argument("--model", default="fake")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for the in-process server")
+    parser.add_argument("--base-url", help="test a running server instead of booting one")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="PATH", help="earlier --json report; exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        _print(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = _regressions(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
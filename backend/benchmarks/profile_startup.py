@@ -0,0 +1,79 @@
+"""Import-time profile of a backend entry point, from python -X importtime.
+
+Imports --entry in a fresh interpreter and breaks the time down by top-level
+package and by slowest individual module. With --budget-ms it exits non-zero
+when the total import time exceeds the budget, so it can gate a deploy.
+
+    python benchmarks/profile_startup.py --entry app.main --top 15
+    python benchmarks/profile_startup.py --entry api.index --budget-ms 50
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def profile(entry):
+    """Return [(module, self_us, cumulative_us, depth)] in import order."""
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tempfile.mkdtemp()}/profile.db", PYTHONPATH=REPO_DIR)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {entry}"], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def summarize(rows, entry, top):
+    total_us = next((cumulative for module, _, cumulative, _ in rows if module == entry), sum(r[1] for r in rows))
+    by_package = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        by_package[module.split(".")[0]] += self_us
+    return {
+        "entry": entry,
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(rows),
+        "packages": [{"package": name, "ms": round(us / 1000, 1)}
+                     for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]],
+        "slowest_modules": [{"module": module, "self_ms": round(self_us / 1000, 1)}
+                            for module, self_us, _, _ in sorted(rows, key=lambda r: -r[1])[:top]],
+    }
+
+
+def main(args):
+    report = summarize(profile(args.entry), args.entry, args.top)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"{report['entry']}: {report['total_ms']:.1f}ms to import {report['modules']} modules")
+        print(f"\n{'package':<28} {'self time':>10}")
+        for row in report["packages"]:
+            print(f"{row['package']:<28} {row['ms']:>8.1f}ms")
+        print(f"\n{'module':<48} {'self time':>10}")
+        for row in report["slowest_modules"]:
+            print(f"{row['module']:<48} {row['self_ms']:>8.1f}ms")
+
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(f"\nimport of {args.entry} took {report['total_ms']:.1f}ms, over the {args.budget_ms:.0f}ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entry", default="app.main", help="module to import")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument("--json", action="store_true")
+    main(parser.parse_args())
@@ -0,0 +1,44 @@
+"""Write (or check) the precomputed OpenAPI schema served by app.main.
+
+Run after changing any route or request/response model, and commit the result:
+
+    python export_openapi.py          # rewrite app/openapi.json
+    python export_openapi.py --check  # exit 1 if app/openapi.json is stale
+"""
+import argparse
+import json
+import sys
+
+from fastapi import FastAPI
+
+from app.main import app, OPENAPI_SCHEMA_PATH
+
+
+def render() -> str:
+    # FastAPI.openapi builds from the routes, bypassing the precomputed copy
+    app.openapi_schema = None
+    return json.dumps(FastAPI.openapi(app), indent=2, sort_keys=True) + "\n"
+
+
+def main(args):
+    schema = render()
+    if args.check:
+        try:
+            with open(OPENAPI_SCHEMA_PATH) as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != schema:
+            print(f"{OPENAPI_SCHEMA_PATH} is out of date; run python export_openapi.py")
+            sys.exit(1)
+        print(f"{OPENAPI_SCHEMA_PATH} is up to date")
+        return
+    with open(OPENAPI_SCHEMA_PATH, "w") as f:
+        f.write(schema)
+    print(f"Wrote {OPENAPI_SCHEMA_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true")
+    main(parser.parse_args())
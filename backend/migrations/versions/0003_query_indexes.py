@@ -0,0 +1,32 @@
+"""Composite indexes for session and message listing
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_chat_sessions_user_id_updated_at', 'chat_sessions', ['user_id', 'updated_at', 'id'], unique=False)
+    op.create_index('ix_messages_session_id_created_at', 'messages', ['session_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_messages_session_id_id', 'messages', ['session_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_session_id_id', table_name='messages')
+    op.drop_index('ix_messages_session_id_created_at', table_name='messages')
+    op.drop_index('ix_chat_sessions_user_id_updated_at', table_name='chat_sessions')
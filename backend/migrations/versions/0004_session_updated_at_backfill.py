@@ -0,0 +1,30 @@
+"""Backfill chat_sessions.updated_at so every session has a sort key
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Sessions used to get updated_at only on their first update; new ones now
+    # get it on insert. Keyset pagination on (updated_at, id) needs it non-null.
+    op.execute(sa.text("UPDATE chat_sessions SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
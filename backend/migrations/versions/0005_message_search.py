@@ -0,0 +1,77 @@
+"""Full-text search index over messages.content
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # FTS5 index over a view of messages plus the owning user, kept in sync by triggers
+        op.execute(
+            "CREATE VIEW messages_search_source AS "
+            "SELECT messages.id AS id, messages.content AS content, 'u' || chat_sessions.user_id AS owner "
+            "FROM messages JOIN chat_sessions ON chat_sessions.id = messages.session_id"
+        )
+        op.execute(
+            "CREATE VIRTUAL TABLE messages_fts USING fts5("
+            "content, owner, content='messages_search_source', content_rowid='id', tokenize='porter unicode61', prefix='2 3')"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts(rowid, content, owner) "
+            "SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id; "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content, owner) "
+            "SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_sessions WHERE id = old.session_id; "
+            "END"
+        )
+        op.execute(
+            "CREATE TRIGGER messages_fts_update AFTER UPDATE OF content, session_id ON messages BEGIN "
+            "INSERT INTO messages_fts(messages_fts, rowid, content, owner) "
+            "SELECT 'delete', old.id, old.content, 'u' || user_id FROM chat_sessions WHERE id = old.session_id; "
+            "INSERT INTO messages_fts(rowid, content, owner) "
+            "SELECT new.id, new.content, 'u' || user_id FROM chat_sessions WHERE id = new.session_id; "
+            "END"
+        )
+        # Index the existing history
+        op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        # A stored generated column fills itself for existing rows and stays in sync
+        op.execute(
+            "ALTER TABLE messages ADD COLUMN search_vector tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED"
+        )
+        op.execute("CREATE INDEX ix_messages_search_vector ON messages USING gin (search_vector)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_update")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_delete")
+        op.execute("DROP TRIGGER IF EXISTS messages_fts_insert")
+        op.execute("DROP TABLE IF EXISTS messages_fts")
+        op.execute("DROP VIEW IF EXISTS messages_search_source")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_messages_search_vector")
+        op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS search_vector")
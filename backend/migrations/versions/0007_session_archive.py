@@ -0,0 +1,67 @@
+"""Compressed archive of idle sessions' messages
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 00:00:06
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.archive import unpack
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('archived_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_chat_sessions_archived_at_updated_at', 'chat_sessions', ['archived_at', 'updated_at'], unique=False)
+
+    op.create_table(
+        'session_archives',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('raw_bytes', sa.Integer(), nullable=False),
+        sa.Column('codec', sa.String(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['chat_sessions.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_session_archives_id', 'session_archives', ['id'], unique=False)
+    op.create_index('ix_session_archives_session_id', 'session_archives', ['session_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Put archived messages back first, so nothing is lost with the table
+    bind = op.get_bind()
+    archives = sa.table('session_archives', sa.column('session_id', sa.Integer), sa.column('codec', sa.String),
+                        sa.column('data', sa.LargeBinary))
+    messages = sa.table('messages', sa.column('id', sa.Integer), sa.column('session_id', sa.Integer),
+                        sa.column('role', sa.String), sa.column('content', sa.Text),
+                        sa.column('created_at', sa.DateTime(timezone=True)))
+    for session_id, codec, data in bind.execute(sa.select(archives)).all():
+        rows = [
+            {**message, 'session_id': session_id,
+             'created_at': datetime.fromisoformat(message['created_at']) if message['created_at'] else None}
+            for message in unpack(data, codec)
+        ]
+        if rows:
+            bind.execute(messages.insert(), rows)
+
+    op.drop_index('ix_session_archives_session_id', table_name='session_archives')
+    op.drop_index('ix_session_archives_id', table_name='session_archives')
+    op.drop_table('session_archives')
+    op.drop_index('ix_chat_sessions_archived_at_updated_at', table_name='chat_sessions')
+    op.drop_column('chat_sessions', 'archived_at')
@@ -1,22 +1,38 @@
 import os
-import google.generativeai as genai
+import sys
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    print("❌ No GEMINI_API_KEY found")
-    exit()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
 
-print(f"✅ Found API Key: {api_key[:5]}...")
+from app.llm.providers import GeminiProvider
 
-genai.configure(api_key=api_key)
 
-print("Listing available models...")
-try:
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"- {m.name}")
-except Exception as e:
-    print(f"❌ Error listing models: {e}")
+async def main():
+    provider = GeminiProvider()
+    if not provider.is_configured():
+        print("❌ No GEMINI_API_KEY found")
+        return
+
+    print(f"✅ Found API Key: {provider.api_key[:5]}...")
+    await provider.startup()
+    resolver = provider.resolver
+
+    print("Listing available models...")
+    try:
+        for name in await resolver.refresh():
+            print(f"- {name}")
+    except Exception as e:
+        print(f"❌ Error listing models: {e}")
+    finally:
+        await provider.shutdown()
+
+    print("\nResolution order used by the chat endpoint:")
+    for name in resolver.resolve():
+        print(f"- {name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
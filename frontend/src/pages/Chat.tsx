@@ -18,13 +18,47 @@ interface ChatSession {
     title: string;
 }
 
+interface StreamEvent {
+    id: string | null;
+    event: string;
+    data: any;
+}
+
+// Parse a text/event-stream response body into events, skipping keep-alive comments
+async function* readEvents(response: Response): AsyncGenerator<StreamEvent> {
+    if (!response.body) throw new Error("No response body");
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) return;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary: number;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const event: StreamEvent = { id: null, event: "message", data: null };
+            for (const line of block.split("\n")) {
+                if (line.startsWith("id: ")) event.id = line.slice(4);
+                else if (line.startsWith("event: ")) event.event = line.slice(7);
+                else if (line.startsWith("data: ")) event.data = JSON.parse(line.slice(6));
+            }
+            if (event.data !== null) yield event;
+        }
+    }
+}
+
 export default function Chat() {
     const navigate = useNavigate();
     const [sessions, setSessions] = useState<ChatSession[]>([]);
+    const [sessionsCursor, setSessionsCursor] = useState<string | null>(null);
     const [currentSessionId, setCurrentSessionId] = useState<number | null>(null);
     const [messages, setMessages] = useState<Message[]>([]);
     const [input, setInput] = useState("");
     const [isLoading, setIsLoading] = useState(false);
+    // Opt-in: otherwise a reply nobody is watching is cancelled server-side
+    const [runInBackground, setRunInBackground] = useState(false);
     const [isSidebarOpen, setIsSidebarOpen] = useState(true);
     const messagesEndRef = useRef<HTMLDivElement>(null);
 
@@ -39,10 +73,23 @@ export default function Chat() {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
     }, [messages]);
 
+    // Sessions are paginated, newest first; older pages are loaded on request
     const fetchSessions = async () => {
         try {
             const res = await api.get("/chat/sessions");
-            setSessions(res.data);
+            setSessions(res.data.items);
+            setSessionsCursor(res.data.next_cursor);
+        } catch (err) {
+            console.error("Failed to load sessions", err);
+        }
+    };
+
+    const loadMoreSessions = async () => {
+        if (sessionsCursor === null) return;
+        try {
+            const res = await api.get("/chat/sessions", { params: { cursor: sessionsCursor } });
+            setSessions((prev) => [...prev, ...res.data.items]);
+            setSessionsCursor(res.data.next_cursor);
         } catch (err) {
             console.error("Failed to load sessions", err);
         }
@@ -51,8 +98,16 @@ export default function Chat() {
     const loadSession = async (id: number) => {
         setCurrentSessionId(id);
         try {
-            const res = await api.get(`/chat/sessions/${id}/messages`);
-            setMessages(res.data);
+            // Messages are paginated; follow next_cursor until the last page
+            const loaded: Message[] = [];
+            let cursor: string | null = null;
+            do {
+                const res = await api.get(`/chat/sessions/${id}/messages`, { params: { cursor } });
+                loaded.push(...res.data.items);
+                cursor = res.data.next_cursor;
+            } while (cursor !== null);
+            // Turns that are not saved yet come back without an id
+            setMessages(loaded.map((msg, i) => ({ ...msg, id: msg.id ?? -(i + 1) })));
         } catch (err) {
             console.error("Failed to load messages", err);
         }
@@ -90,7 +145,9 @@ export default function Chat() {
                 body: JSON.stringify({
                     message: userMsg.content,
                     session_id: currentSessionId,
-                    model: "gemini-pro"
+                    model: "gemini-pro",
+                    // Keep generating if the tab closes or the network drops; the reply is saved either way
+                    ...(runInBackground ? { detach: true } : {})
                 })
             });
 
@@ -105,31 +162,55 @@ export default function Chat() {
                 throw new Error(errorData.detail || "Failed to send message");
             }
 
-            if (!response.body) throw new Error("No response body");
-
-            const reader = response.body.getReader();
-            const decoder = new TextDecoder();
-            let assistantMsg: Message = { id: Date.now() + 1, role: "assistant", content: "" };
-
+            const assistantMsg: Message = { id: Date.now() + 1, role: "assistant", content: "" };
             setMessages((prev) => [...prev, assistantMsg]);
 
-            while (true) {
-                const { done, value } = await reader.read();
-                if (done) break;
-                const chunk = decoder.decode(value);
-                assistantMsg.content += chunk;
-
+            const showReply = () => {
                 setMessages((prev) => {
                     const newMsgs = [...prev];
                     newMsgs[newMsgs.length - 1] = { ...assistantMsg };
                     return newMsgs;
                 });
-            }
-
-            if (!currentSessionId) {
-                // fetchSessions(); // Optimization: Only fetch if needed or update local state
-                // Ideally we get the session ID back in headers or first chunk, but for now simple refresh is okay
-                fetchSessions();
+            };
+
+            // The reply arrives as Server-Sent Events. If the connection drops
+            // mid-reply, reconnect to the stream and replay from the last event seen.
+            const streamId = response.headers.get("X-Stream-Id");
+            let lastEventId = "";
+            let finished = false;
+            let current: Response = response;
+            for (let attempt = 0; !finished && attempt < 3; attempt++) {
+                if (attempt > 0) {
+                    if (!streamId) break;
+                    current = await fetch(`${API_BASE_URL}/chat/streams/${streamId}`, {
+                        headers: { "Authorization": `Bearer ${token}`, "Last-Event-ID": lastEventId }
+                    });
+                    if (!current.ok) break;
+                }
+                try {
+                    for await (const event of readEvents(current)) {
+                        if (event.id) lastEventId = event.id;
+                        if (event.event === "token") {
+                            assistantMsg.content += event.data.text;
+                            showReply();
+                        } else if (event.event === "snapshot") {
+                            // The reply so far, sent when replay no longer reaches back far enough
+                            assistantMsg.content = event.data.text;
+                            showReply();
+                        } else if (event.event === "error") {
+                            assistantMsg.content += event.data.message;
+                            showReply();
+                        } else if (event.event === "done") {
+                            finished = true;
+                            if (!currentSessionId) {
+                                setCurrentSessionId(event.data.session_id);
+                                fetchSessions();
+                            }
+                        }
+                    }
+                } catch (err) {
+                    console.error("Stream interrupted, resuming", err);
+                }
             }
 
         } catch (err: any) {
@@ -218,6 +299,15 @@ export default function Chat() {
                             </motion.div>
                         ))}
                     </AnimatePresence>
+                    {sessionsCursor !== null && (
+                        <Button
+                            variant="ghost"
+                            className="w-full text-xs text-gray-400 hover:bg-white/10"
+                            onClick={loadMoreSessions}
+                        >
+                            Load older chats
+                        </Button>
+                    )}
                 </div>
 
                 <div className="border-t border-border/50 p-4 space-y-1 bg-black/20">
@@ -404,8 +494,17 @@ export default function Chat() {
                             </Button>
                         </div>
                     </div>
-                    <div className="text-center mt-4 text-xs text-gray-500 font-medium tracking-wide">
-                        Powered by TitanBot AI. Accuracy may vary.
+                    <div className="flex items-center justify-center gap-4 mt-4 text-xs text-gray-500 font-medium tracking-wide">
+                        <label className="flex items-center gap-1.5 cursor-pointer select-none">
+                            <input
+                                type="checkbox"
+                                className="accent-cyan-500"
+                                checked={runInBackground}
+                                onChange={(e) => setRunInBackground(e.target.checked)}
+                            />
+                            Keep generating if I leave
+                        </label>
+                        <span>Powered by TitanBot AI. Accuracy may vary.</span>
                     </div>
                 </div>
             </div>
@@ -1,31 +1,55 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+import os
+import secrets
 import ollama
 
+from scheduler import InferenceScheduler, SchedulerBusy
+from sessions import SessionStore
+
 app = Flask(__name__)
 
-convo = []
-SYSTEM_PROMPT = """You are a teaching assistant named TitanBot created by Abdulkalam. 
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+SESSION_COOKIE = "titanbot_session"
+
+SYSTEM_PROMPT = """You are a teaching assistant named TitanBot created by Abdulkalam.
 Answer all the questions asked based on Machine learning, Deep Learning, neural network, image processing , computer vision, python programming, Django API, Flask API, Streamlit, Generative AI this programming languages only."""
 
-def chat_with_ollama(prompt):
-    global convo
-    
-    # Initialize conversation with system prompt if empty
-    if not convo:
-        convo.append({"role": "system", "content": SYSTEM_PROMPT})
-        
-    convo.append({"role": "user", "content": prompt})
-
-    try:
-        response = ollama.chat(
-            model="llama3.2",
-            messages=convo
-        )
-        reply = response["message"]["content"]
-        convo.append({"role": "assistant", "content": reply})
-        return reply
-    except Exception as e:
-        return f"Error: {str(e)}. Make sure Ollama is running."
+# One conversation per visitor (keyed by a cookie), with bounded history and
+# idle eviction. The Ollama client is shared: it is thread-safe and reuses its
+# connections to the daemon.
+sessions = SessionStore(
+    max_history=int(os.getenv("BOT_MAX_HISTORY", 20)),
+    idle_timeout=float(os.getenv("BOT_SESSION_IDLE_TIMEOUT", 1800)),
+    max_sessions=int(os.getenv("BOT_MAX_SESSIONS", 1000)),
+)
+client = ollama.Client(host=os.getenv("OLLAMA_HOST"))
+# All generations go through the scheduler, which queues them so the daemon is
+# never asked for more than it runs well at once, merges identical requests and
+# keeps the model loaded between visitors
+scheduler = InferenceScheduler(
+    client,
+    keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
+    max_parallel=int(os.getenv("OLLAMA_MAX_PARALLEL", 1)),
+    max_queue=int(os.getenv("OLLAMA_MAX_QUEUE", 100)),
+)
+
+def stream_ollama(session, prompt):
+    """Yield the reply chunk by chunk; the turn is saved once it is complete."""
+    # The session lock keeps one visitor's turns in order; other visitors are not blocked
+    with session.lock:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}, *session.messages(), {"role": "user", "content": prompt}]
+        reply = []
+        try:
+            for text in scheduler.stream(OLLAMA_MODEL, messages):
+                reply.append(text)
+                yield text
+        except SchedulerBusy:
+            yield "TitanBot is busy right now, please try again in a moment."
+            return
+        except Exception as e:
+            yield f"Error: {str(e)}. Make sure Ollama is running."
+            return
+        session.add_turn(prompt, "".join(reply))
 
 @app.route("/")
 def home():
@@ -37,9 +61,23 @@ def chat():
     user_message = data.get("message")
     if not user_message:
         return jsonify({"error": "No message provided"}), 400
-        
-    bot_reply = chat_with_ollama(user_message)
-    return jsonify({"reply": bot_reply})
+
+    session_id = request.cookies.get(SESSION_COOKIE) or secrets.token_urlsafe(16)
+    session = sessions.get(session_id)
+
+    if data.get("stream", True):
+        response = Response(stream_with_context(stream_ollama(session, user_message)), mimetype="text/plain")
+    else:
+        response = jsonify({"reply": "".join(stream_ollama(session, user_message))})
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="Lax")
+    return response
+
+@app.route("/stats")
+def stats():
+    # Queue depth and wait times, to tell when the daemon needs more parallel slots
+    return jsonify({**scheduler.stats(), "sessions": len(sessions)})
 
 if __name__ == "__main__":
-    app.run(debug=True, port=8080) # Using 8080 to avoid conflict with backend on 8000
+    # Threaded so concurrent visitors stream side by side; for production use a
+    # threaded WSGI server, e.g. `waitress-serve --threads 16 --port 8080 app:app`
+    app.run(debug=True, port=8080, threaded=True) # Using 8080 to avoid conflict with backend on 8000
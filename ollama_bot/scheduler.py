@@ -0,0 +1,130 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Shares the local Ollama daemon between the bot's request threads:
+#   - at most max_parallel generations run at once; the rest wait in FIFO
+#     order (the executor's queue), and at most max_queue may wait;
+#   - a request identical to one queued or running (same model and messages -
+#     typically the same first question from two visitors) subscribes to it
+#     instead of starting another generation, and gets every chunk from the start;
+#   - a generation nobody reads any more is skipped if still queued, or stopped
+#     at the next chunk if running, closing its stream to the daemon;
+#   - stats() reports the queue depth and how long requests waited to start.
+
+
+class SchedulerBusy(Exception):
+    """The queue is full."""
+
+
+class _Job:
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.abandoned = False
+        self.submitted_at = time.monotonic()
+        self.changed = threading.Condition()
+
+
+class InferenceScheduler:
+    def __init__(self, client, keep_alive="30m", max_parallel=1, max_queue=100):
+        self.client = client
+        self.keep_alive = keep_alive
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="ollama")
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._queued = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.started = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def stream(self, model, messages):
+        """Yield the reply chunks for ``messages``, sharing the generation with identical requests."""
+        key = hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is None:
+                if self._queued >= self.max_queue:
+                    self.rejected += 1
+                    raise SchedulerBusy()
+                job = self._inflight[key] = _Job(key)
+                self._queued += 1
+                self.submitted += 1
+                self._executor.submit(self._run, job, model, messages)
+            else:
+                self.coalesced += 1
+            job.subscribers += 1
+
+        cursor = 0
+        try:
+            while True:
+                with job.changed:
+                    while cursor == len(job.chunks) and not job.done:
+                        job.changed.wait()
+                    chunks, done = job.chunks[cursor:], job.done
+                for chunk in chunks:
+                    yield chunk
+                cursor += len(chunks)
+                if done:
+                    if job.error is not None:
+                        raise job.error
+                    return
+        finally:
+            with self._lock:
+                job.subscribers -= 1
+                if not job.subscribers and not job.done:
+                    job.abandoned = True
+                    self._forget(job)
+
+    def _run(self, job, model, messages):
+        with self._lock:
+            self._queued -= 1
+            if not job.abandoned:
+                wait = time.monotonic() - job.submitted_at
+                self.started += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+        parts = None
+        try:
+            if job.abandoned:
+                return
+            parts = self.client.chat(model=model, messages=messages, stream=True, keep_alive=self.keep_alive)
+            for part in parts:
+                if job.abandoned:
+                    return
+                content = part["message"]["content"]
+                if content:
+                    with job.changed:
+                        job.chunks.append(content)
+                        job.changed.notify_all()
+        except Exception as e:
+            job.error = e
+        finally:
+            # Closes the HTTP response, so the daemon stops generating for an abandoned job
+            if parts is not None and hasattr(parts, "close"):
+                parts.close()
+            with job.changed:
+                job.done = True
+                job.changed.notify_all()
+            with self._lock:
+                self._forget(job)
+
+    def _forget(self, job):
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def stats(self):
+        with self._lock:
+            return {"queued": self._queued, "inflight": len(self._inflight), "submitted": self.submitted,
+                    "coalesced": self.coalesced, "rejected": self.rejected, "started": self.started,
+                    "avg_wait_seconds": self.total_wait / self.started if self.started else 0.0,
+                    "max_wait_seconds": self.max_wait}
@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Per-visitor conversation store for the Flask bot. Each session keeps only the
+# last max_history messages, in whole question/reply turns so the model never
+# sees a reply without its question (the system prompt is added per request, not
+# stored), and sessions idle for longer than idle_timeout - or the least recently used
+# ones beyond max_sessions - are dropped, so memory stays bounded however many
+# visitors come and go. One store-wide lock guards the session map; each session
+# has its own lock so two tabs of the same visitor take turns instead of
+# interleaving their history.
+
+
+class Session:
+    def __init__(self, max_history):
+        # (user message, reply) pairs; an odd max_history rounds down to whole turns
+        self.turns = deque(maxlen=max(1, max_history // 2))
+        self.lock = threading.Lock()
+        self.last_seen = time.monotonic()
+
+    def messages(self):
+        return [message for user_message, reply in self.turns
+                for message in ({"role": "user", "content": user_message}, {"role": "assistant", "content": reply})]
+
+    def add_turn(self, user_message, reply):
+        self.turns.append((user_message, reply))
+
+
+class SessionStore:
+    def __init__(self, max_history=20, idle_timeout=1800, max_sessions=1000, sweep_interval=60):
+        self.max_history = max_history
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.evicted = 0
+
+    def get(self, session_id):
+        """Return the session for ``session_id``, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(self.max_history)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session
+
+    def _sweep(self, now):
+        # Least recently used first, so stop at the first session still in use
+        self._last_sweep = now
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._sessions)